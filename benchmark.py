@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+benchmark.py
+Reproducible offline benchmarks for every pipeline stage.
+
+Fixtures are generated locally and deterministically (seeded): a multi-page PDF
+with lyric-like text and staff lines, a synthetic service recording with tones,
+noise and silences, and a fake hymnal_songs.json. Each stage runs in its own
+spawned process so peak RSS is measured per stage. Heavy models (PaddleOCR,
+Whisper, sentence-transformers) can be replaced by stubs with --stub-models.
+
+Usage examples:
+  Run all:     python benchmark.py run --out bench/base.json --stub-models
+  One stage:   python benchmark.py run --out bench/new.json --stages preprocess is_music
+  Compare:     python benchmark.py compare bench/base.json bench/new.json --tolerance 0.15
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import math
+import time
+import types
+import wave
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from typing import Callable, Dict, List
+
+import instrument
+from pipeline import load_script
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ---- Config ----
+FIXTURE_DIR = os.path.join(HERE, "bench_fixtures")
+SEED = 1234
+PDF_PAGES = 8
+AUDIO_SECONDS = 120
+SAMPLE_RATE = 16000
+FAKE_SONGS = 200
+REPEAT = 5  # timed calls per stage (stages over many items time each item instead)
+STUB_DIM = 384  # matches all-MiniLM-L6-v2
+
+WORDS = ("come thou almighty king help us thy name to sing praise father all glorious "
+         "o'er victorious reign over ancient of days holy spirit grace love saviour "
+         "jesus lord heaven glory cross blood redeemer soul rest peace home").split()
+
+
+# ---- Fixtures ----
+def _lyric_line(rng: random.Random, n: int = 7) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def make_songs(path: str, rng: random.Random, count: int = FAKE_SONGS):
+    songs = []
+    for n in range(1, count + 1):
+        verses = ["%d. %s" % (v, "\n".join(_lyric_line(rng) for _ in range(4))) for v in range(1, 5)]
+        songs.append({
+            "song_number": n,
+            "page_numbers": 10 + n,
+            "song_title": _lyric_line(rng, 4),
+            "song_author": "Synthetic Author, 1800-1870",
+            "song_date": "1800",
+            "song_dates": "1800, 1870",
+            "song_bible_verse_reference": "Psalm %d:%d" % (rng.randint(1, 150), rng.randint(1, 20)),
+            "song_bible_verse_text": _lyric_line(rng, 10),
+            "song_lyrics": "\n".join(verses),
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(songs, f, ensure_ascii=False, indent=2)
+
+
+def make_pdf(path: str, rng: random.Random, pages: int = PDF_PAGES):
+    """Hymnal-like pages: title, number, four staff systems with lyric rows."""
+    import fitz
+    doc = fitz.open()
+    for p in range(pages):
+        page = doc.new_page(width=432, height=648)  # 6x9 in
+        page.insert_text((40, 40), "PRAISE AND ADORATION", fontsize=9)
+        page.insert_text((40, 62), _lyric_line(rng, 4), fontsize=14)
+        page.insert_text((370, 62), str(p + 1), fontsize=22)
+        y = 90
+        for _ in range(4):
+            for s in range(5):  # a staff
+                page.draw_line((36, y + s * 5), (396, y + s * 5), width=0.6)
+            y += 30
+            for v in range(1, 5):  # stacked verse rows under the staff
+                words = _lyric_line(rng).split()
+                row = " - ".join(words[:2]) + " " + " ".join(words[2:])
+                page.insert_text((40, y), f"{v}. {row}", fontsize=8)
+                y += 10
+            y += 20
+    doc.save(path, no_new_id=True)  # no random trailer /ID, so the same seed gives the same bytes
+    doc.close()
+
+
+def make_audio(path: str, rng: random.Random, seconds: int = AUDIO_SECONDS):
+    """16 kHz mono wav alternating sung tones, spoken-like noise and silence."""
+    import numpy as np
+    np_rng = np.random.default_rng(rng.randint(0, 2 ** 31))
+    parts = []
+    t = 0
+    while t < seconds:
+        kind = ("tone", "noise", "silence")[len(parts) % 3]
+        dur = {"tone": 20, "noise": 8, "silence": 2}[kind]
+        n = dur * SAMPLE_RATE
+        x = np.arange(n) / SAMPLE_RATE
+        if kind == "tone":
+            f0 = rng.choice([196.0, 220.0, 261.6, 293.7])
+            y = sum(0.3 / h * np.sin(2 * np.pi * f0 * h * x) for h in range(1, 5))
+            y = y * (0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * x))
+        elif kind == "noise":
+            y = 0.2 * np_rng.standard_normal(n) * (np.sin(2 * np.pi * 3 * x) > 0)
+        else:
+            y = 0.0005 * np_rng.standard_normal(n)
+        parts.append(y)
+        t += dur
+    pcm = (np.clip(np.concatenate(parts), -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+
+
+def ensure_fixtures(fixture_dir: str = FIXTURE_DIR) -> Dict[str, str]:
+    """Generate missing fixtures. Same seed -> byte-identical inputs."""
+    os.makedirs(fixture_dir, exist_ok=True)
+    fx = {
+        "songs": os.path.join(fixture_dir, "songs.json"),
+        "pdf": os.path.join(fixture_dir, "hymnal.pdf"),
+        "audio": os.path.join(fixture_dir, "service.wav"),
+    }
+    makers = {"songs": make_songs, "pdf": make_pdf, "audio": make_audio}
+    for name, path in fx.items():
+        if not os.path.exists(path):
+            print(f"Generating {name} fixture → {path}")
+            try:
+                makers[name](path, random.Random(f"{SEED}:{name}"))
+            except ImportError as e:
+                # stages that need this fixture will report the error themselves
+                print(f"  skipped: {e}")
+    return fx
+
+
+def fixture_digest(fx: Dict[str, str]) -> Dict[str, str]:
+    out = {}
+    for name, path in fx.items():
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            out[name] = hashlib.sha256(f.read()).hexdigest()[:16]
+    return out
+
+
+# ---- Model stubs ----
+class _StubSentenceTransformer:
+    """Deterministic hashed bag-of-words embeddings."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, convert_to_numpy=True):
+        import numpy as np
+        out = np.zeros((len(texts), STUB_DIM), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, int(hashlib.md5(w.encode()).hexdigest()[:8], 16) % STUB_DIM] += 1.0
+        return out
+
+
+class _StubPaddleOCR:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def predict(self, img):
+        return [{"dt_polys": [], "rec_texts": [], "rec_scores": []}]
+
+
+def install_stubs():
+    """Replace heavy model packages before any pipeline script is imported."""
+    st = types.ModuleType("sentence_transformers")
+    st.SentenceTransformer = _StubSentenceTransformer
+    po = types.ModuleType("paddleocr")
+    po.PaddleOCR = _StubPaddleOCR
+    wh = types.ModuleType("whisper")
+
+    def _no_whisper(*args, **kwargs):
+        raise RuntimeError("whisper is stubbed in benchmarks")
+
+    wh.load_model = wh.load_audio = _no_whisper
+    sys.modules.update({"sentence_transformers": st, "paddleocr": po, "whisper": wh})
+
+
+# ---- Stages ----
+# Each setup returns (calls, unit): a list of zero-arg callables that are timed
+# one by one, and the name of the item a call processes.
+
+def _song_texts(fx) -> List[str]:
+    with open(fx["songs"], "r", encoding="utf-8") as f:
+        return [f"{s['song_title']}\n{s['song_lyrics']}" for s in json.load(f)]
+
+
+def setup_pdf_to_images(fx, args):
+    ocr = load_script("hymnal-ocr-v2.py")
+    return [lambda: ocr.pdf_to_images(fx["pdf"], dpi=args.dpi) for _ in range(args.repeat)], "document"
+
+
+def setup_preprocess(fx, args):
+    ocr = load_script("hymnal-ocr-v2.py")
+    pages = [img.convert("RGB") for img in ocr.pdf_to_images(fx["pdf"], dpi=args.dpi)]
+    return [lambda img=img: ocr.preprocess(img) for img in pages], "page"
+
+
+def setup_chunk_text(fx, args):
+    es = load_script("embed_search.py")
+    text = "\n\n".join(_song_texts(fx))
+    return [lambda: es.chunk_text(text) for _ in range(args.repeat)], "corpus"
+
+
+def setup_embed_texts(fx, args):
+    es = load_script("embed_search.py")
+    chunks = es.chunk_text("\n\n".join(_song_texts(fx)))
+    ei = es.EmbeddingIndex()
+    batches = [chunks[i:i + 64] for i in range(0, len(chunks), 64)]
+    return [lambda b=b: ei.embed_texts(b) for b in batches], "batch of 64 chunks"
+
+
+def setup_search(fx, args):
+    es = load_script("embed_search.py")
+    texts = _song_texts(fx)
+    ei = es.EmbeddingIndex()
+    ei.build_from_documents([(f"song{i}", t) for i, t in enumerate(texts)])
+    rng = random.Random(SEED)
+    queries = [" ".join(rng.sample(WORDS, 5)) for _ in range(50)]
+    return [lambda q=q: ei.search(q, k=5) for q in queries], "query"
+
+
+def setup_detect_silences(fx, args):
+    tsw = load_script("transcribe_split_whisper.py")
+    return [lambda: tsw.detect_silences(fx["audio"]) for _ in range(args.repeat)], "recording"
+
+
+def setup_split_audio(fx, args):
+    import pathlib
+    import tempfile
+    tsw = load_script("transcribe_split_whisper.py")
+    silences = tsw.detect_silences(fx["audio"])
+    tmp = pathlib.Path(tempfile.mkdtemp(prefix="bench_split_"))
+    _cleanups.append(lambda: shutil.rmtree(tmp, ignore_errors=True))
+    return [lambda: tsw.split_audio(fx["audio"], silences, tmp) for _ in range(args.repeat)], "recording"
+
+
+def setup_is_music(fx, args):
+    import librosa
+    md = load_script("music_detection.py")
+    y, sr = librosa.load(fx["audio"], sr=None, mono=True)
+    step = md.CHUNK_SECONDS * sr
+    return [lambda c=y[i:i + step]: md.is_music(c, sr) for i in range(0, len(y), step)], "20s chunk"
+
+
+_cleanups: List[Callable] = []  # run after a stage's calls, e.g. to remove scratch directories
+
+STAGES: Dict[str, Callable] = {
+    "pdf_to_images": setup_pdf_to_images,
+    "preprocess": setup_preprocess,
+    "chunk_text": setup_chunk_text,
+    "embed_texts": setup_embed_texts,
+    "search": setup_search,
+    "detect_silences": setup_detect_silences,
+    "split_audio": setup_split_audio,
+    "is_music": setup_is_music,
+}
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * q
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def run_stage(name: str, fx: Dict[str, str], args) -> Dict:
+    """Runs inside a fresh process so peak RSS belongs to this stage alone."""
+    if args.stub_models:
+        install_stubs()
+    try:
+        calls, unit = STAGES[name](fx, args)
+        calls[0]()  # warm-up (imports, lazy init); not timed
+        latencies = []
+        start = time.perf_counter()
+        for call in calls:
+            t0 = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - t0)
+        total = time.perf_counter() - start
+    except Exception as e:  # missing optional dependency, ffmpeg, etc.
+        return {"stage": name, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        while _cleanups:
+            _cleanups.pop()()
+    latencies.sort()
+    return {
+        "stage": name,
+        "unit": unit,
+        "calls": len(latencies),
+        "total_s": total,
+        "throughput_per_s": len(latencies) / total if total > 0 else None,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "peak_rss_mb": instrument.peak_rss_mb(),
+    }
+
+
+def run(args) -> Dict:
+    fx = ensure_fixtures(args.fixtures)
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for name in args.stages:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            r = pool.submit(run_stage, name, fx, args).result()
+        if "error" in r:
+            print(f"{name:16s} skipped ({r['error']})")
+        else:
+            print(f"{name:16s} p50 {r['p50_ms']:9.2f} ms  p95 {r['p95_ms']:9.2f} ms  "
+                  f"{r['throughput_per_s']:9.2f} {r['unit']}/s  rss {r['peak_rss_mb']:7.1f} MB")
+        results.append(r)
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.platform(),
+        "stub_models": args.stub_models,
+        "seed": SEED,
+        "fixtures": fixture_digest(fx),
+        "stages": results,
+    }
+
+
+def compare(base: Dict, new: Dict, tolerance: float) -> List[str]:
+    """Return a line per metric that got worse by more than `tolerance` (fraction)."""
+    regressions = []
+    if base.get("fixtures") != new.get("fixtures"):
+        print("warning: fixture digests differ; results may not be comparable")
+    old = {s["stage"]: s for s in base["stages"] if "error" not in s}
+    for s in new["stages"]:
+        o = old.get(s["stage"])
+        if o is None:
+            continue
+        if "error" in s:  # ran in the base, crashes now
+            print(f"{s['stage']:16s} error: {s['error']} REGRESSION")
+            regressions.append(f"{s['stage']} error: {s['error']}")
+            continue
+        for metric in ("p50_ms", "p95_ms", "peak_rss_mb"):
+            before, after = o[metric], s[metric]
+            change = (after - before) / before if before else 0.0
+            flag = "REGRESSION" if change > tolerance else ""
+            print(f"{s['stage']:16s} {metric:12s} {before:10.2f} → {after:10.2f} ({change:+.1%}) {flag}")
+            if flag:
+                regressions.append(f"{s['stage']} {metric} {change:+.1%}")
+    return regressions
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the hymnal pipeline")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_run = sub.add_parser("run", help="Generate fixtures (if needed) and time stages")
+    p_run.add_argument("--out", required=True, help="Results JSON path")
+    p_run.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    p_run.add_argument("--fixtures", default=FIXTURE_DIR)
+    p_run.add_argument("--repeat", type=int, default=REPEAT)
+    p_run.add_argument("--dpi", type=int, default=150)
+    p_run.add_argument("--stub-models", action="store_true", help="Use stub OCR/Whisper/embedding models")
+
+    p_cmp = sub.add_parser("compare", help="Flag regressions between two result files")
+    p_cmp.add_argument("base")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--tolerance", type=float, default=0.15)
+
+    args = parser.parse_args()
+
+    if args.cmd == "run":
+        report = run(args)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    elif args.cmd == "compare":
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        with open(args.new, "r", encoding="utf-8") as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
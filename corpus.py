@@ -0,0 +1,621 @@
+#!/usr/bin/env python3
+"""
+corpus.py
+Many hymnals side by side: per-book artifacts, sharded OCR and one merged index.
+
+Everything belonging to a book lives under <root>/<hymnal_id>/:
+
+  hymnal.json                    id, title, page count, original file names
+  source.pdf                     the scan
+  general-index.txt              its indexes (optional; needed to segment songs)
+  topical-index.txt
+  shards.json                    page-range shards written by `shard`
+  shards/<first>-<last>/         one finished shard: store/ (OCR store) + text.txt
+  shards/<first>-<last>.claim    held by the worker OCRing that range
+  shards/<first>-<last>.failed   one line per failed attempt
+  ocr_store/, text.txt           the whole book, assembled from its shards
+  catalog.sqlite, songs.jsonl    catalog and hymn records (hymn_corpus format)
+  index.faiss, meta.json         embeddings of the book's songs
+
+<root>/merged/ holds songs.jsonl, index.faiss and meta.json for all books, and
+songs are addressed across books as "<hymnal_id>:<number>". merged/songs.jsonl
+is written book by book and hymnals.json records each book's byte range, so a
+qualified lookup is a binary search of the merged index on (number, range).
+
+Workers share nothing but the root directory (a network mount works): a worker
+claims a shard by creating its .claim file with O_EXCL, runs hymnal-ocr-v2.py
+on that page range into a private temp directory and renames it into place
+when OCR finished cleanly. Claims are touched while OCR runs; one left stale by
+a dead worker is taken over, and a worker that finds its claim taken over stops
+OCRing that range. If two workers ever OCR the same range, only the first rename
+lands. Delete a .failed file to retry a shard that gave up.
+
+Usage examples:
+  Register:  python corpus.py add christianhymnal --pdf christianhymnal.pdf \\
+               --general-index texts/general-index.txt --topical-index texts/topical-index.txt
+  Shard:     python corpus.py shard christianhymnal --pages-per-shard 20
+  Worker:    python corpus.py --root /mnt/hymnals work        (on every machine)
+  Locally:   python corpus.py local christianhymnal --workers 4
+  Progress:  python corpus.py status
+  Per book:  python corpus.py assemble christianhymnal
+             python corpus.py songs christianhymnal           (or --from-json hymnal_songs.json)
+             python corpus.py embed christianhymnal
+  Merge:     python corpus.py merge
+  Lookup:    python corpus.py get christianhymnal:103
+  Search:    python embed_search.py search --index_path corpus/merged/index.faiss \\
+               --meta_path corpus/merged/meta.json --query "praise to the lord"
+"""
+
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import subprocess
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+import instrument
+
+if TYPE_CHECKING:
+    from hymn_corpus import HymnRecord
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ---- Config ----
+CORPUS_DIR = "corpus"
+MERGED = "merged"  # reserved directory name for the cross-book artifacts
+PAGES_PER_SHARD = 20
+OCR_SCRIPT = "hymnal-ocr-v2.py"
+OCR_DPI = 350
+HEARTBEAT = 30  # seconds between claim refreshes while a shard is OCR'd
+STALE_AFTER = 600  # a claim untouched this long belongs to a dead worker
+MAX_ATTEMPTS = 3  # failed attempts before a shard is left for a human
+LLM_MODEL = "phi3:mini"
+
+ID_RE = re.compile(r"^[a-z0-9][a-z0-9_-]*$")  # no ":", it separates book and number
+
+
+def qualify(hymnal_id: str, number: int) -> str:
+    return f"{hymnal_id}:{number}"
+
+
+def parse_qualified(qualified: str) -> Tuple[str, int]:
+    """"christianhymnal:103" -> ("christianhymnal", 103)."""
+    hymnal_id, _, number = qualified.rpartition(":")
+    if not ID_RE.match(hymnal_id) or not number.isdigit():
+        raise ValueError(f"Not a hymnal-qualified song number: {qualified!r}")
+    return hymnal_id, int(number)
+
+
+def shard_name(first: int, last: int) -> str:
+    return f"{first:05d}-{last:05d}"
+
+
+def _write_json(path: str, data):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _replace_dir(tmp: str, dest: str):
+    shutil.rmtree(dest, ignore_errors=True)
+    os.rename(tmp, dest)
+
+
+# ---- Shard claims (shared storage, no coordinator) ----
+def _claim(path: str, worker: str) -> bool:
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"worker": worker, "host": socket.gethostname(), "pid": os.getpid(), "time": time.time()}, f)
+    return True
+
+
+def _is_stale(path: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(path) > STALE_AFTER
+    except FileNotFoundError:
+        return False
+
+
+def _take_over(path: str, worker: str) -> bool:
+    """Claim a shard whose worker died. Of several workers noticing, one wins the rename."""
+    stale = f"{path}.stale-{worker}"
+    try:
+        os.rename(path, stale)
+    except FileNotFoundError:
+        return False
+    os.remove(stale)
+    return _claim(path, worker)
+
+
+def _owns(path: str, worker: str) -> bool:
+    try:
+        return _read_json(path).get("worker") == worker
+    except (FileNotFoundError, ValueError):
+        return False
+
+
+def _refresh(path: str, worker: str) -> bool:
+    """Heartbeat a claim; False once it was taken over (the new owner's claim is left alone)."""
+    if not _owns(path, worker):
+        return False
+    os.utime(path)
+    return True
+
+
+def _release(path: str, worker: str):
+    """Remove a claim, unless another worker has taken it over since."""
+    if _owns(path, worker):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class Corpus:
+    def __init__(self, root: str = CORPUS_DIR):
+        self.root = root
+
+    # -- Layout --
+    def path(self, hymnal_id: str, *parts: str) -> str:
+        if not ID_RE.match(hymnal_id) or hymnal_id == MERGED:
+            raise ValueError(f"Bad hymnal id {hymnal_id!r} (lowercase letters, digits, '-', '_'; not {MERGED!r})")
+        return os.path.join(self.root, hymnal_id, *parts)
+
+    def merged_path(self, *parts: str) -> str:
+        return os.path.join(self.root, MERGED, *parts)
+
+    def hymnals(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(d for d in os.listdir(self.root)
+                      if d != MERGED and os.path.exists(os.path.join(self.root, d, "hymnal.json")))
+
+    def info(self, hymnal_id: str) -> Dict:
+        path = self.path(hymnal_id, "hymnal.json")
+        if not os.path.exists(path):
+            raise KeyError(f"No hymnal {hymnal_id!r} in {self.root} (run `corpus.py add` first)")
+        return _read_json(path)
+
+    def add(self, hymnal_id: str, pdf: str, title: Optional[str] = None,
+            general_index: Optional[str] = None, topical_index: Optional[str] = None) -> Dict:
+        """Copy a book and its index files into the corpus."""
+        import fitz
+        os.makedirs(self.path(hymnal_id, "shards"), exist_ok=True)
+        shutil.copyfile(pdf, self.path(hymnal_id, "source.pdf"))
+        for src, name in ((general_index, "general-index.txt"), (topical_index, "topical-index.txt")):
+            if src:
+                shutil.copyfile(src, self.path(hymnal_id, name))
+        with fitz.open(self.path(hymnal_id, "source.pdf")) as doc:
+            pages = doc.page_count
+        info = {"hymnal_id": hymnal_id, "title": title or hymnal_id, "pages": pages, "pdf": os.path.basename(pdf),
+                "general_index": general_index, "topical_index": topical_index}
+        _write_json(self.path(hymnal_id, "hymnal.json"), info)
+        return info
+
+    # -- Sharding --
+    def shard(self, hymnal_id: str, pages_per_shard: int = PAGES_PER_SHARD, force: bool = False) -> List[Dict]:
+        """Split the book into page ranges. Re-sharding orphans finished shards, so it needs force."""
+        manifest = self.path(hymnal_id, "shards.json")
+        if os.path.exists(manifest) and not force:
+            raise FileExistsError(f"{manifest} exists; pass --force to re-shard")
+        pages = self.info(hymnal_id)["pages"]
+        shards = []
+        for first in range(1, pages + 1, pages_per_shard):
+            last = min(first + pages_per_shard - 1, pages)
+            shards.append({"hymnal_id": hymnal_id, "shard": shard_name(first, last), "first": first, "last": last})
+        _write_json(manifest, shards)
+        return shards
+
+    def shards(self, hymnal_id: str) -> List[Dict]:
+        manifest = self.path(hymnal_id, "shards.json")
+        return _read_json(manifest) if os.path.exists(manifest) else []
+
+    def _shard_path(self, shard: Dict, suffix: str = "") -> str:
+        return self.path(shard["hymnal_id"], "shards", shard["shard"] + suffix)
+
+    def _failures(self, shard: Dict) -> int:
+        path = self._shard_path(shard, ".failed")
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+
+    def shard_state(self, shard: Dict) -> str:
+        if os.path.isdir(self._shard_path(shard)):
+            return "done"
+        if os.path.exists(self._shard_path(shard, ".claim")):
+            return "stale" if _is_stale(self._shard_path(shard, ".claim")) else "claimed"
+        return "failed" if self._failures(shard) >= MAX_ATTEMPTS else "pending"
+
+    def status(self, hymnal_ids: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+        report = {}
+        for hymnal_id in hymnal_ids or self.hymnals():
+            counts = {"pending": 0, "claimed": 0, "stale": 0, "failed": 0, "done": 0}
+            for shard in self.shards(hymnal_id):
+                counts[self.shard_state(shard)] += 1
+            report[hymnal_id] = counts
+        return report
+
+    # -- Workers --
+    def claim_next(self, worker: str, hymnal_ids: Optional[List[str]] = None) -> Optional[Dict]:
+        for hymnal_id in hymnal_ids or self.hymnals():
+            for shard in self.shards(hymnal_id):
+                state = self.shard_state(shard)
+                claim = self._shard_path(shard, ".claim")
+                if not (state == "pending" and _claim(claim, worker) or state == "stale" and _take_over(claim, worker)):
+                    continue
+                if os.path.isdir(self._shard_path(shard)):  # finished while we were looking
+                    _release(claim, worker)
+                    continue
+                return shard
+        return None
+
+    def run_shard(self, shard: Dict, worker: str, ocr_script: str = OCR_SCRIPT) -> Optional[bool]:
+        """
+        OCR one claimed shard with the OCR script and publish it; releases the claim
+        if still ours. Returns None, without output or a failure record, if another
+        worker took the claim over meanwhile.
+        """
+        final, claim = self._shard_path(shard), self._shard_path(shard, ".claim")
+        tmp = f"{final}.tmp-{worker}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        script = ocr_script if os.path.isabs(ocr_script) else os.path.join(HERE, ocr_script)
+        cmd = [sys.executable, script, "--pdf", self.path(shard["hymnal_id"], "source.pdf"),
+               "--pages", f"{shard['first']}-{shard['last']}",
+               "--ocr-store", os.path.join(tmp, "store"), "--out", os.path.join(tmp, "text.txt")]
+        try:
+            with open(os.path.join(tmp, "ocr.log"), "w", encoding="utf-8") as log:
+                proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+                while True:
+                    try:
+                        code = proc.wait(timeout=HEARTBEAT)
+                        break
+                    except subprocess.TimeoutExpired:
+                        if not _refresh(claim, worker):  # taken over as stale; the new owner redoes it
+                            proc.kill()
+                            proc.wait()
+                            shutil.rmtree(tmp, ignore_errors=True)
+                            return None
+            error = f"exit code {code}" if code else self._check_shard(tmp, shard)
+            if error is None:
+                try:
+                    os.rename(tmp, final)
+                except OSError:  # another worker took over a claim we were still using, and won
+                    shutil.rmtree(tmp)
+                return True
+            with open(os.path.join(tmp, "ocr.log"), "r", encoding="utf-8", errors="replace") as f:
+                tail = f.read()[-2000:]
+            with open(self._shard_path(shard, ".failed"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"worker": worker, "time": time.time(), "error": error, "log": tail}) + "\n")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        finally:
+            _release(claim, worker)
+
+    @staticmethod
+    def _check_shard(tmp: str, shard: Dict) -> Optional[str]:
+        from ocr_store import OCRStore
+        try:
+            pages = OCRStore(os.path.join(tmp, "store")).pages
+        except FileNotFoundError as e:
+            return str(e)
+        expected = list(range(shard["first"], shard["last"] + 1))
+        return None if pages == expected else f"store has pages {pages[:3]}..., expected {shard['first']}-{shard['last']}"
+
+    def work(self, worker: str, hymnal_ids: Optional[List[str]] = None, max_shards: Optional[int] = None,
+             ocr_script: str = OCR_SCRIPT) -> Dict[str, int]:
+        """Claim and OCR shards until none are left (or max_shards were attempted)."""
+        tally = {"done": 0, "failed": 0, "lost": 0}
+        while max_shards is None or sum(tally.values()) < max_shards:
+            shard = self.claim_next(worker, hymnal_ids)
+            if shard is None:
+                break
+            print(f"[{worker}] {shard['hymnal_id']} pages {shard['first']}-{shard['last']}", flush=True)
+            with instrument.timer("shard", hymnal=shard["hymnal_id"], shard=shard["shard"], worker=worker):
+                ok = self.run_shard(shard, worker, ocr_script)
+            if ok is None:
+                tally["lost"] += 1
+                instrument.count("shards_lost")
+                print(f"[{worker}] {shard['hymnal_id']} {shard['shard']} was taken over by another worker",
+                      file=sys.stderr, flush=True)
+                continue
+            tally["done" if ok else "failed"] += 1
+            instrument.count("shards_done" if ok else "shards_failed")
+            if not ok:
+                print(f"[{worker}] {shard['hymnal_id']} {shard['shard']} failed "
+                      f"(see {self._shard_path(shard, '.failed')})", file=sys.stderr, flush=True)
+        return tally
+
+    # -- Per-book outputs --
+    def assemble(self, hymnal_id: str) -> int:
+        """Concatenate finished shards into the book's OCR store and text. Returns pages."""
+        from ocr_store import OCRStore, OCRStoreWriter
+        shards = self.shards(hymnal_id)
+        missing = [s["shard"] for s in shards if self.shard_state(s) != "done"]
+        if not shards or missing:
+            raise RuntimeError(f"{hymnal_id}: shards not finished: {', '.join(missing) or '(not sharded)'}")
+        tmp = self.path(hymnal_id, "ocr_store.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        lines, pages = [], 0
+        with OCRStoreWriter(tmp, source=self.path(hymnal_id, "source.pdf"), dpi=OCR_DPI) as writer:
+            for shard in shards:
+                for page in OCRStore(os.path.join(self._shard_path(shard), "store")).iter_pages():
+                    writer.add_page(page["page"], page, size=page["size"])
+                    lines.extend(page["rec_texts"])
+                    pages += 1
+        _replace_dir(tmp, self.path(hymnal_id, "ocr_store"))
+        with open(self.path(hymnal_id, "text.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+        return pages
+
+    def _extract_songs(self, hymnal_id: str, llm_model: Optional[str]) -> List["HymnRecord"]:
+        """Segment the assembled text at index titles and pull fields with the rule extractor."""
+        from field_extractor import FieldExtractor, field_specs, fill_gaps
+        from hymn_catalog import HymnCatalog, build_catalog
+        from hymn_corpus import HymnRecord
+        from title_matcher import TitleMatcher, split_songs
+        general, topical = self.path(hymnal_id, "general-index.txt"), self.path(hymnal_id, "topical-index.txt")
+        if not (os.path.exists(general) and os.path.exists(topical)):
+            raise FileNotFoundError(f"{hymnal_id}: needs general and topical index files to find songs "
+                                    f"(corpus.py add --general-index/--topical-index), or use --from-json")
+        catalog_path = self.path(hymnal_id, "catalog.sqlite")
+        build_catalog(catalog_path, general, topical, songs_path="")
+        catalog = HymnCatalog(catalog_path)
+        with open(self.path(hymnal_id, "text.txt"), "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        chunks = [(number, chunk) for number, _, chunk in split_songs(TitleMatcher(catalog.titles()), lines)]
+        results = FieldExtractor(catalog).extract_all(chunks)
+        if llm_model:
+            from pipeline import PROMPT_PATH, load_script
+            ollama_please = load_script("ollama-please.py")
+            ask = lambda prompt: ollama_please.ask_ollama(prompt, model=llm_model)
+            specs = field_specs(PROMPT_PATH)
+        records = []
+        for result, (_, chunk) in zip(results, chunks):
+            fields = fill_gaps(result, "\n".join(chunk), ask, specs) if llm_model and result["gaps"] else result["fields"]
+            records.append(HymnRecord.from_dict(fields))
+        return records
+
+    def songs(self, hymnal_id: str, json_path: Optional[str] = None, llm_model: Optional[str] = None) -> int:
+        """Write the book's hymn records, tagged with its id. Returns the record count."""
+        from hymn_corpus import from_json, write_jsonl
+        records = from_json(json_path) if json_path else self._extract_songs(hymnal_id, llm_model)
+
+        def tagged():
+            for rec in records:
+                rec.hymnal_id = hymnal_id
+                yield rec
+        return write_jsonl(self.path(hymnal_id, "songs.jsonl"), tagged())
+
+    def embed(self, hymnal_id: str) -> int:
+        """Embed the book's songs; sources are hymnal-qualified numbers."""
+        from embed_search import EmbeddingIndex
+        from hymn_corpus import read_jsonl
+        docs = [(qualify(hymnal_id, s.song_number), f"{s.song_title or ''}\n{s.song_lyrics or ''}")
+                for s in read_jsonl(self.path(hymnal_id, "songs.jsonl")) if s.song_number is not None]
+        ei = EmbeddingIndex()
+        n = ei.build_from_documents(docs)
+        ei.save(self.path(hymnal_id, "index.faiss"), self.path(hymnal_id, "meta.json"))
+        return n
+
+    # -- Cross-book --
+    def merge(self, hymnal_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Union every book's songs.jsonl and embedding index into <root>/merged.
+        Vectors are copied out of the per-book FAISS indexes, so nothing is
+        re-embedded; index metadata gains the hymnal id.
+        """
+        from hymn_corpus import read_jsonl, write_jsonl
+        hymnal_ids = hymnal_ids or self.hymnals()
+        tmp = self.merged_path() + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        books = []
+        for hymnal_id in hymnal_ids:
+            has_songs = os.path.exists(self.path(hymnal_id, "songs.jsonl"))
+            has_index = os.path.exists(self.path(hymnal_id, "index.faiss"))
+            if not has_songs:
+                print(f"  {hymnal_id}: no songs.jsonl yet, skipped", file=sys.stderr)
+            books.append({"hymnal_id": hymnal_id, "title": self.info(hymnal_id)["title"],
+                          "songs": 0, "vectors": 0, "has_songs": has_songs, "has_index": has_index})
+
+        def records(hymnal_id):
+            for rec in read_jsonl(self.path(hymnal_id, "songs.jsonl")):
+                rec.hymnal_id = hymnal_id
+                yield rec
+
+        songs_path = os.path.join(tmp, "songs.jsonl")
+        write_jsonl(songs_path, [])
+        for book in books:
+            if book["has_songs"]:
+                start = os.path.getsize(songs_path)
+                book["songs"] = write_jsonl(songs_path, records(book["hymnal_id"]), append=True)
+                book["bytes"] = [start, os.path.getsize(songs_path)]
+
+        if any(b["has_index"] for b in books):
+            import faiss
+            merged, id_to_meta = None, {}
+            for book in books:
+                if not book["has_index"]:
+                    continue
+                hymnal_id = book["hymnal_id"]
+                index = faiss.read_index(self.path(hymnal_id, "index.faiss"))
+                meta = _read_json(self.path(hymnal_id, "meta.json"))["id_to_meta"]
+                if merged is None:
+                    merged = faiss.IndexFlatIP(index.d)
+                elif index.d != merged.d:
+                    raise ValueError(f"{hymnal_id}: embedding dim {index.d} != {merged.d}; re-run `corpus.py embed`")
+                base = merged.ntotal
+                merged.add(index.reconstruct_n(0, index.ntotal))
+                for i, m in meta.items():
+                    id_to_meta[base + int(i)] = dict(m, hymnal_id=hymnal_id)
+                book["vectors"] = index.ntotal
+            faiss.write_index(merged, os.path.join(tmp, "index.faiss"))
+            # same layout EmbeddingIndex.save writes, so embed_search.py can search it
+            with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"next_id": merged.ntotal, "id_to_meta": id_to_meta}, f, ensure_ascii=False, indent=2)
+
+        for book in books:
+            del book["has_songs"], book["has_index"]
+        _write_json(os.path.join(tmp, "hymnals.json"), books)
+        _replace_dir(tmp, self.merged_path())
+        return books
+
+    def get(self, qualified: str) -> List["HymnRecord"]:
+        """Look a song up in the merged index; books merged without songs fall back to their own file."""
+        from hymn_corpus import HymnCorpus
+        hymnal_id, number = parse_qualified(qualified)
+        merged = self.merged_path("hymnals.json")
+        books = {b["hymnal_id"]: b for b in _read_json(merged)} if os.path.exists(merged) else {}
+        if "bytes" in books.get(hymnal_id, {}):
+            with HymnCorpus(self.merged_path("songs.jsonl")) as corpus:
+                return corpus.get_all(number, *books[hymnal_id]["bytes"])
+        with HymnCorpus(self.path(hymnal_id, "songs.jsonl")) as book:
+            return book.get_all(number)
+
+    def run_local(self, hymnal_id: str, workers: int, pages_per_shard: int = PAGES_PER_SHARD,
+                  ocr_script: str = OCR_SCRIPT) -> Dict[str, int]:
+        """Shard (if needed) and OCR a book with separate worker processes, as machines would."""
+        if not self.shards(hymnal_id):
+            self.shard(hymnal_id, pages_per_shard)
+        host = socket.gethostname()
+        procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--root", self.root, "work",
+                                   "--hymnal", hymnal_id, "--worker", f"{host}-local{i}", "--ocr-script", ocr_script])
+                 for i in range(workers)]
+        for proc in procs:
+            proc.wait()
+        return self.status([hymnal_id])[hymnal_id]
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Multi-hymnal corpus: sharded OCR and merged search")
+    parser.add_argument("--root", default=CORPUS_DIR, help="Corpus directory (shared storage for workers)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_add = sub.add_parser("add", help="Register a hymnal PDF (and its index files) under an id")
+    p_add.add_argument("hymnal_id")
+    p_add.add_argument("--pdf", required=True)
+    p_add.add_argument("--title")
+    p_add.add_argument("--general-index")
+    p_add.add_argument("--topical-index")
+
+    p_shard = sub.add_parser("shard", help="Split a hymnal into page-range shards (prints them as JSONL)")
+    p_shard.add_argument("hymnal_id")
+    p_shard.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD)
+    p_shard.add_argument("--force", action="store_true", help="Re-shard even if shards.json exists")
+
+    p_work = sub.add_parser("work", help="Claim and OCR shards until none are left")
+    p_work.add_argument("--hymnal", action="append", help="Only these hymnals (repeatable; default all)")
+    p_work.add_argument("--worker", default=f"{socket.gethostname()}-{os.getpid()}")
+    p_work.add_argument("--max-shards", type=int)
+
+    p_local = sub.add_parser("local", help="Run several workers as local processes, then report")
+    p_local.add_argument("hymnal_id")
+    p_local.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    p_local.add_argument("--pages-per-shard", type=int, default=PAGES_PER_SHARD)
+    p_local.add_argument("--assemble", action="store_true", help="Assemble the book if every shard finished")
+
+    for p in (p_work, p_local):
+        p.add_argument("--ocr-script", default=OCR_SCRIPT,
+                       help="Script taking --pdf --pages --ocr-store --out (default: hymnal-ocr-v2.py)")
+
+    sub.add_parser("status", help="Shard progress per hymnal")
+
+    p_asm = sub.add_parser("assemble", help="Join a hymnal's finished shards into ocr_store/ and text.txt")
+    p_asm.add_argument("hymnal_id")
+
+    p_songs = sub.add_parser("songs", help="Write a hymnal's songs.jsonl")
+    p_songs.add_argument("hymnal_id")
+    p_songs.add_argument("--from-json", help="Import hymnal_songs.json/hymns.json instead of extracting")
+    p_songs.add_argument("--llm", action="store_true", help="Ask Ollama for fields the rules miss")
+    p_songs.add_argument("--llm-model", default=LLM_MODEL)
+
+    p_embed = sub.add_parser("embed", help="Build a hymnal's embedding index")
+    p_embed.add_argument("hymnal_id")
+
+    p_merge = sub.add_parser("merge", help="Merge songs and indexes of all (or some) hymnals into merged/")
+    p_merge.add_argument("hymnal_ids", nargs="*")
+
+    p_get = sub.add_parser("get", help="Print a song by hymnal-qualified number, e.g. christianhymnal:103")
+    p_get.add_argument("qualified")
+
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.metrics)
+    corpus = Corpus(args.root)
+
+    try:
+        with instrument.profile(args.profile):
+            run_command(corpus, args)
+    except (KeyError, ValueError, FileExistsError, FileNotFoundError, RuntimeError) as e:
+        sys.exit(e.args[0] if isinstance(e, KeyError) and e.args else str(e))
+
+
+def run_command(corpus: Corpus, args):
+    if args.cmd == "add":
+        info = corpus.add(args.hymnal_id, args.pdf, args.title, args.general_index, args.topical_index)
+        print(f"{info['hymnal_id']}: {info['pages']} pages → {corpus.path(args.hymnal_id)}")
+
+    elif args.cmd == "shard":
+        for shard in corpus.shard(args.hymnal_id, args.pages_per_shard, args.force):
+            print(json.dumps(shard))
+
+    elif args.cmd == "work":
+        tally = corpus.work(args.worker, args.hymnal, args.max_shards, args.ocr_script)
+        print(f"[{args.worker}] {tally['done']} shard(s) done, {tally['failed']} failed"
+              + (f", {tally['lost']} taken over" if tally["lost"] else ""))
+
+    elif args.cmd == "local":
+        start = time.perf_counter()
+        counts = corpus.run_local(args.hymnal_id, args.workers, args.pages_per_shard, args.ocr_script)
+        print(f"{args.hymnal_id}: {counts} in {time.perf_counter() - start:.1f}s with {args.workers} workers")
+        if args.assemble and counts["done"] == sum(counts.values()):
+            print(f"Assembled {corpus.assemble(args.hymnal_id)} pages → {corpus.path(args.hymnal_id, 'text.txt')}")
+
+    elif args.cmd == "status":
+        for hymnal_id, counts in corpus.status().items():
+            total = sum(counts.values())
+            detail = ", ".join(f"{n} {state}" for state, n in counts.items() if n and state != "done")
+            print(f"{hymnal_id:24s} {counts['done']}/{total} shards done" + (f" ({detail})" if detail else ""))
+
+    elif args.cmd == "assemble":
+        print(f"Assembled {corpus.assemble(args.hymnal_id)} pages → {corpus.path(args.hymnal_id, 'text.txt')}")
+
+    elif args.cmd == "songs":
+        n = corpus.songs(args.hymnal_id, args.from_json, args.llm_model if args.llm else None)
+        print(f"{n} songs → {corpus.path(args.hymnal_id, 'songs.jsonl')}")
+
+    elif args.cmd == "embed":
+        print(f"Indexed {corpus.embed(args.hymnal_id)} chunks → {corpus.path(args.hymnal_id, 'index.faiss')}")
+
+    elif args.cmd == "merge":
+        for book in corpus.merge(args.hymnal_ids):
+            print(f"  {book['hymnal_id']:24s} {book['songs']} songs, {book['vectors']} vectors")
+        print(f"Merged → {corpus.merged_path()}")
+
+    elif args.cmd == "get":
+        records = corpus.get(args.qualified)
+        if not records:
+            sys.exit(f"No hymn {args.qualified}")
+        for rec in records:
+            print(json.dumps(rec.to_dict(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
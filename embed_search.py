@@ -18,6 +18,7 @@ import numpy as np
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 import faiss
+import instrument
 
 # ---- Config ----
 EMBED_MODEL = "all-MiniLM-L6-v2"  # small, fast, good general embeddings
@@ -74,9 +75,11 @@ class EmbeddingIndex:
 
     def embed_texts(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
         """Embed a list of texts -> numpy array (n, dim)."""
-        embs = self.model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
-        # normalize to unit length for cosine similarity
-        faiss.normalize_L2(embs)
+        with instrument.timer("embed_texts", n=len(texts)):
+            embs = self.model.encode(texts, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+            # normalize to unit length for cosine similarity
+            faiss.normalize_L2(embs)
+        instrument.count("texts_embedded", len(texts))
         return embs.astype(D_TYPE)
 
     def build_from_documents(self, docs: List[Tuple[str, str]]):
@@ -126,7 +129,8 @@ class EmbeddingIndex:
         vec = self.embed_texts([query])
         if self.index is None or self.index.ntotal == 0:
             return []
-        D, I = self.index.search(vec, k)
+        with instrument.timer("search", k=k, ntotal=self.index.ntotal):
+            D, I = self.index.search(vec, k)
         results: List[Dict] = []
         for score, idx in zip(D[0], I[0]):
             if idx < 0:
@@ -179,8 +183,14 @@ def main():
     p_add.add_argument("--meta_path", required=True)
     p_add.add_argument("--file", required=True)
 
+    instrument.add_arguments(parser)
     args = parser.parse_args()
+    instrument.configure(args.metrics)
 
+    with instrument.profile(args.profile):
+        run_command(args)
+
+def run_command(args):
     ei = EmbeddingIndex()
 
     if args.cmd == "build":
@@ -198,8 +208,8 @@ def main():
         for r in results:
             meta = r["meta"]
             print(f"score={r['score']:.4f} id={r['id']} source={meta.get('source')} chunk={meta.get('chunk_index')}")
-            snippet = meta.get("text", "")
-            print(f"  snippet: {snippet[:400].replace('\\n',' ')}")
+            snippet = meta.get("text", "")[:400].replace("\n", " ")
+            print(f"  snippet: {snippet}")
             print("-" * 60)
 
     elif args.cmd == "add":
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+field_extractor.py
+Rule-based extraction of hymnal_songs.json fields from a song's OCR text.
+
+Most fields sit in rigid places under the title: the large song number, the
+scripture line ("Bless the Lord, O my soul.—Psalm 103:1"), author/composer
+lines with dates ("Silas J. Vail, 1818-1884"), the running category header,
+and the verses starting "1.". Compiled regexes plus the index catalog fill
+these in about a millisecond per song, each with a confidence. Only songs left with
+missing or low-confidence fields go to the LLM, and then with a short prompt
+asking for just those fields.
+
+Usage examples:
+  Savings report:  python field_extractor.py --text texts/hymnal-text-v2.txt
+  Pipeline chunks: python field_extractor.py --songs-dir .pipeline/artifacts/segments/<key>/songs
+  Fill gaps too:   python field_extractor.py --text texts/hymnal-text-v2.txt --llm --out songs.json
+"""
+
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+from hymn_catalog import CATALOG_PATH, HymnCatalog, normalize_title
+from hymn_corpus import SONG_FIELDS
+from lyric_layout import join_syllables
+
+# ---- Config ----
+PROMPT_PATH = "prompts/improved_prompt.md"
+MIN_CONFIDENCE = 0.7  # fields below this are re-asked from the LLM
+CHARS_PER_TOKEN = 4  # rough estimate for llama-family tokenizers on English text
+HEADER_ZONE = 12  # lines under the title searched for number, scripture and authors
+
+# Fields the LLM is asked for when the rules leave them empty or unsure. The
+# dates follow the author lines, and page numbers are rarely in the chunk text.
+GAP_FIELDS = ["song_number", "song_title", "song_author", "song_bible_verse_reference",
+              "song_bible_verse_text", "song_lyrics"]
+
+BOOKS = {
+    "gen", "ex", "exod", "lev", "num", "deut", "josh", "judg", "ruth", "sam", "kings", "chron", "ezra",
+    "neh", "esth", "job", "psalm", "psalms", "ps", "prov", "eccl", "eccles", "song", "isa", "jer", "lam",
+    "ezek", "dan", "hos", "joel", "amos", "obad", "jonah", "mic", "nah", "hab", "zeph", "hag", "zech",
+    "mal", "matt", "mark", "luke", "john", "acts", "rom", "cor", "gal", "eph", "phil", "col", "thess",
+    "tim", "titus", "philem", "heb", "jas", "james", "pet", "peter", "jude", "rev", "colossians",
+    "ephesians", "romans", "hebrews", "revelation", "isaiah", "matthew", "genesis", "exodus",
+}
+
+NUMBER_RE = re.compile(r"^\s*(\d{1,3})\s*$")
+# "<quoted text>—I Tim. 1:17", with OCR'd digits (l/I for 1, O for 0) in chapter:verse
+SCRIPTURE_RE = re.compile(
+    r"^(?P<text>.*?)\s*[—–−-]?\s*"
+    r"(?P<ref>(?:(?:[123]|I{1,3})\s*)?(?P<book>[A-Z][a-z]+)\.?\s+[\dIlO]{1,3}:[\dIlO]{1,3}"
+    r"(?:\s*[-–,]\s*[\dIlO]{1,3})*)\.?\s*$")
+YEAR_RE = re.compile(r"(?<!\d)(1[4-9]\d\d)(?!\d)")
+CENTURY_RE = re.compile(r"\b[\dI]{1,2}(?:st|nd|rd|th) Century", re.IGNORECASE)
+CITATION_RE = re.compile(r"\d\s*:\s*[\dIl]")  # any chapter:verse-looking text
+CREDIT_RE = re.compile(r"^(?:Arr\.|Arranged|From|Source|Words|Music|Tr\.|Translated|Refrain|Adapted|Anon|Old|Traditional|Alt\.)",
+                       re.IGNORECASE)
+VERSE_RE = re.compile(r"^\s*[1Il]\s*\.(?:\s|$)")  # "1." (OCR: "I.", "l."), sometimes alone on its row
+WORDS_RE = re.compile(r"[A-Za-z]{2,}")
+NAME_RE = re.compile(r"^[A-Z][A-Za-z.'’-]*(?:\s+[A-Z][A-Za-z.'’-]*)+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _fix_digits(ref: str) -> str:
+    """OCR reads 1 as l/I and 0 as O inside "103:1l"; the book's roman numeral is left alone."""
+    head, _, tail = ref.rpartition(" ")
+    return f"{head} {tail.translate(str.maketrans('lIO', '110'))}".strip()
+
+
+def _is_noise(line: str) -> bool:
+    return not WORDS_RE.search(line)
+
+
+class FieldExtractor:
+    """
+    Deterministic extractor. With a catalog, titles come from the index and
+    category headers are recognised by the topical index's section names.
+    """
+
+    def __init__(self, catalog: Optional[HymnCatalog] = None):
+        self.catalog = catalog
+        self.categories = {normalize_title(t): t for t in catalog.by_topic} if catalog else {}
+
+    def category(self, line: str) -> Optional[str]:
+        s = line.strip()
+        if not s.isupper():
+            return None
+        return self.categories.get(normalize_title(s))
+
+    def extract(self, lines: List[str], number: Optional[int] = None, category: Optional[str] = None) -> Dict:
+        """
+        Fields for one song chunk (its first line is the title). Returns
+          {"fields": {...}, "confidence": {field: 0..1}, "gaps": [...], "next_category": str | None}
+        next_category is a running header at the chunk's end, which belongs to the next song.
+        """
+        fields: Dict = {f: None for f in SONG_FIELDS}
+        conf: Dict[str, float] = {}
+        notes = []
+
+        # Song number: the caller's (from segmentation), else a bare number right under the title.
+        head = lines[1:HEADER_ZONE]
+        if number is None:
+            for l in head[:3]:
+                m = NUMBER_RE.match(l)
+                if m:
+                    number = int(m.group(1))
+                    break
+        if number is not None:
+            fields["song_number"] = number
+            conf["song_number"] = 1.0
+
+        # Title: canonical index title, else the OCR'd first line.
+        entry = self.catalog.song(number) if self.catalog and number is not None else None
+        if entry:
+            fields["song_title"] = entry["title"]
+            conf["song_title"] = 1.0
+            if len(entry["pages"]) == 1:  # longer lists mix in pages that merely mention the song
+                fields["page_numbers"] = entry["pages"][0]
+                conf["page_numbers"] = 0.9
+        elif lines and lines[0].strip():
+            fields["song_title"] = lines[0].strip()
+            conf["song_title"] = 0.6
+
+        # Header zone: everything under the title up to the first verse line.
+        verse_at = next((i for i, l in enumerate(lines) if VERSE_RE.match(l)), None)
+        zone = lines[1:min(verse_at if verse_at is not None else HEADER_ZONE, HEADER_ZONE)]
+        credits, prev = [], ""
+        for l in zone:
+            s = l.strip()
+            if not s or NUMBER_RE.match(s) or _is_noise(s):
+                continue
+            m = SCRIPTURE_RE.match(s) if fields["song_bible_verse_reference"] is None else None
+            if m:
+                # "lsa." / "Joln": an unknown book is kept but left for the LLM to check
+                known = re.sub(r"^l", "I", m.group("book")).lower() in BOOKS
+                fields["song_bible_verse_reference"] = _fix_digits(re.sub(r"\s+", " ", m.group("ref")))
+                conf["song_bible_verse_reference"] = 0.95 if known else 0.5
+                # the quotation may end on the line above ("...blood of Christ.—" / "I Pet. 1:18, 19")
+                text = m.group("text").strip() or (prev.rstrip("—–−-").strip() if prev[-1:] in "—–−-" else "")
+                if prev and text == prev.rstrip("—–−-").strip() and credits and credits[-1] == prev:
+                    credits.pop()
+                fields["song_bible_verse_text"] = text or None
+                conf["song_bible_verse_text"] = 0.9 if text else 0.8  # a bare reference has no quotation
+                prev = s
+                continue
+            if YEAR_RE.search(s) or CREDIT_RE.match(s) or NAME_RE.match(s):
+                credits.append(s)
+            prev = s
+
+        if credits:
+            credits = list(dict.fromkeys(credits))  # words and music by the same person
+            fields["song_author"] = ", ".join(credits)
+            dated = any(YEAR_RE.search(c) or CENTURY_RE.search(c) or CREDIT_RE.match(c) for c in credits)
+            conf["song_author"] = 0.9 if dated else 0.6
+            years = list(dict.fromkeys(y for c in credits for y in YEAR_RE.findall(c)))
+            if years:
+                fields["song_date"], fields["song_dates"] = years[0], ", ".join(years)
+                conf["song_date"] = conf["song_dates"] = 0.9
+
+        # Lyrics: from "1." on, noise and running headers dropped, syllables rejoined per row.
+        next_category = self._next_category(lines, verse_at)
+        if verse_at is not None:
+            rows = []
+            for l in lines[verse_at:]:
+                if self.category(l):
+                    continue
+                if not _is_noise(l):
+                    rows.append(join_syllables([l], strip_dangling=False))
+            fields["song_lyrics"] = "\n".join(rows)
+            conf["song_lyrics"] = 0.85
+        else:
+            notes.append("no verse numbers found")
+
+        if category:
+            fields["song_category"] = category
+            conf["song_category"] = 0.9
+
+        # A clean header with no chapter:verse text anywhere simply has no scripture line.
+        if (fields["song_bible_verse_reference"] is None and conf.get("song_author", 0.0) >= MIN_CONFIDENCE
+                and not any(CITATION_RE.search(l) for l in zone)):
+            conf["song_bible_verse_reference"] = conf["song_bible_verse_text"] = 0.8
+        gaps = [f for f in GAP_FIELDS if conf.get(f, 0.0) < MIN_CONFIDENCE]
+        if gaps:
+            notes.append("rules could not fill: " + ", ".join(gaps))
+        fields["confidence_notes"] = "; ".join(notes) or None
+        return {"fields": fields, "confidence": conf, "gaps": gaps, "next_category": next_category}
+
+    def _next_category(self, lines: List[str], verse_at: Optional[int]) -> Optional[str]:
+        """A running header printed in the chunk's lyrics (the last one), or anywhere if it has none."""
+        if verse_at is None:
+            return next((c for c in map(self.category, lines) if c), None)
+        found = [c for c in map(self.category, lines[verse_at:]) if c]
+        return found[-1] if found else None
+
+    def running_categories(self, chunks: List[List[str]]) -> List[Optional[str]]:
+        """The category header in effect for each of a book's chunks, in order."""
+        out, category = [], None
+        for lines in chunks:
+            out.append(category)
+            verse_at = next((i for i, l in enumerate(lines) if VERSE_RE.match(l)), None)
+            category = self._next_category(lines, verse_at) or category
+        return out
+
+    def extract_all(self, chunks: List[Tuple[int, List[str]]]) -> List[Dict]:
+        """Extract a book's chunks in order, carrying the running category header forward."""
+        categories = self.running_categories([lines for _, lines in chunks])
+        return [self.extract(lines, number, category) for (number, lines), category in zip(chunks, categories)]
+
+
+# ---- LLM fallback ----
+def field_specs(prompt_path: str = PROMPT_PATH) -> Dict[str, str]:
+    """The "### `field`" sections of the full prompt, keyed by field name."""
+    with open(prompt_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    specs = {}
+    for m in re.finditer(r"^### `(\w+)`.*?(?=^##)", text, re.MULTILINE | re.DOTALL):
+        specs[m.group(1)] = m.group(0).strip()
+    return specs
+
+
+def gap_prompt(result: Dict, chunk: str, specs: Dict[str, str]) -> str:
+    """A prompt asking only for the gaps, with the fields already known given as context."""
+    known = {k: v for k, v in result["fields"].items()
+             if v is not None and k in ("song_number", "song_title") and k not in result["gaps"]}
+    parts = ["You clean up OCR text from a hymnal. From the input below, extract only these fields "
+             "and answer with one JSON object with exactly these keys (null when absent):"]
+    parts.extend(specs.get(f, f"### `{f}`") for f in result["gaps"])
+    if known:
+        parts.append("Already known: " + json.dumps(known, ensure_ascii=False))
+    parts.append("## Input\n\n" + chunk)
+    return "\n\n".join(parts)
+
+
+def parse_response(response: str) -> Dict:
+    start, end = response.find("{"), response.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if isinstance(data, dict) and isinstance(data.get("songs"), list) and data["songs"]:
+        data = data["songs"][0]
+    return data if isinstance(data, dict) else {}
+
+
+def fill_gaps(result: Dict, chunk: str, ask: Callable[[str], str], specs: Dict[str, str]) -> Dict:
+    """Ask the LLM for the gap fields and merge what it returns. Returns the song record."""
+    song = dict(result["fields"])
+    if not result["gaps"]:
+        return song
+    answer = parse_response(ask(gap_prompt(result, chunk, specs)))
+    filled = [f for f in result["gaps"] if answer.get(f) is not None]
+    for f in filled:
+        song[f] = answer[f]
+    if "song_author" in filled and song["song_dates"] is None:
+        years = list(dict.fromkeys(YEAR_RE.findall(str(song["song_author"]))))
+        if years:
+            song["song_date"], song["song_dates"] = years[0], ", ".join(years)
+    missing = [f for f in result["gaps"] if f not in filled]
+    song["confidence_notes"] = (f"LLM filled: {', '.join(filled) or 'nothing'}"
+                                + (f"; still missing: {', '.join(missing)}" if missing else ""))
+    return song
+
+
+def savings_report(results: List[Dict], chunks: List[str], full_prompt: str, specs: Dict[str, str],
+                   catalog: Optional[HymnCatalog] = None) -> Dict:
+    """
+    LLM calls and prompt tokens with the rules in front, versus one full-prompt
+    call per segmented song. With a catalog, songs that were never segmented
+    (and so are in neither count) are listed too.
+    """
+    base_tokens = sum(estimate_tokens(full_prompt + "\n\n## Input\n\n" + c) for c in chunks)
+    calls = [(r, c) for r, c in zip(results, chunks) if r["gaps"]]
+    used_tokens = sum(estimate_tokens(gap_prompt(r, c, specs)) for r, c in calls)
+    gap_counts: Dict[str, int] = {}
+    for r, _ in calls:
+        for g in r["gaps"]:
+            gap_counts[g] = gap_counts.get(g, 0) + 1
+    report = {
+        "songs": len(results),
+        "llm_calls_baseline": len(results),
+        "llm_calls": len(calls),
+        "llm_calls_saved": len(results) - len(calls),
+        "prompt_tokens_baseline": base_tokens,
+        "prompt_tokens": used_tokens,
+        "prompt_tokens_saved": base_tokens - used_tokens,
+        "gaps": dict(sorted(gap_counts.items(), key=lambda kv: -kv[1])),
+    }
+    if catalog is not None:
+        missing = sorted(set(catalog.songs) - {r["fields"]["song_number"] for r in results})
+        report.update({"catalog_songs": len(catalog.songs), "unsegmented": len(missing),
+                       "unsegmented_numbers": missing})
+    return report
+
+
+# ---- CLI ----
+def load_chunks(args, catalog: Optional[HymnCatalog]) -> List[Tuple[int, List[str]]]:
+    if args.songs_dir:
+        names = sorted((n for n in os.listdir(args.songs_dir) if n.endswith(".txt")), key=lambda n: int(n[:-4]))
+        chunks = []
+        for name in names:
+            with open(os.path.join(args.songs_dir, name), "r", encoding="utf-8") as f:
+                chunks.append((int(name[:-4]), f.read().split("\n")))
+        return chunks
+    from title_matcher import TitleMatcher, split_songs
+    if catalog is None:
+        sys.exit("--text needs a catalog to find song boundaries")
+    with open(args.text, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    return [(number, chunk) for number, _, chunk in split_songs(TitleMatcher(catalog.titles()), lines)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule-based song field extraction with LLM fallback for gaps")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--text", help="Whole-book OCR text; split into songs at confirmed titles")
+    src.add_argument("--songs-dir", help="Directory of <number>.txt song chunks (pipeline segments stage)")
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--prompt", default=PROMPT_PATH)
+    parser.add_argument("--llm", action="store_true", help="Send gap prompts to Ollama and merge the answers")
+    parser.add_argument("--llm-model", default="phi3:mini")
+    parser.add_argument("--out", help="Write the song records as JSON")
+    args = parser.parse_args()
+
+    catalog = HymnCatalog(args.catalog) if os.path.exists(args.catalog) else None
+    extractor = FieldExtractor(catalog)
+    chunks = load_chunks(args, catalog)
+    texts = ["\n".join(lines) for _, lines in chunks]
+
+    start = time.perf_counter()
+    results = extractor.extract_all(chunks)
+    elapsed = time.perf_counter() - start
+
+    with open(args.prompt, "r", encoding="utf-8") as f:
+        full_prompt = f.read()
+    specs = field_specs(args.prompt)
+    report = savings_report(results, texts, full_prompt, specs, catalog)
+    report["us_per_song"] = round(elapsed * 1e6 / max(len(results), 1), 1)
+    print(json.dumps(report, indent=1), file=sys.stderr)
+
+    if args.llm:
+        from pipeline import load_script
+        ollama_please = load_script("ollama-please.py")
+        ask = lambda prompt: ollama_please.ask_ollama(prompt, model=args.llm_model)
+        songs = [fill_gaps(r, t, ask, specs) for r, t in zip(results, texts)]
+    else:
+        songs = [r["fields"] for r in results]
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(songs, f, ensure_ascii=False, indent=2)
+        print(f"{len(songs)} songs → {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
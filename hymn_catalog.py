@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+hymn_catalog.py
+Compile the general and topical indexes into one SQLite catalog.
+
+The catalog maps song number -> canonical title, alternate (first-line) titles,
+topics and pages, with indexes in both directions, so later stages can look a
+song up without re-parsing the index text files. Index lines that could not be
+parsed are recorded in an `issues` table and reported at build time.
+
+Usage examples:
+  Build:   python hymn_catalog.py build --out hymn_catalog.sqlite
+  Lookup:  python hymn_catalog.py lookup --catalog hymn_catalog.sqlite --number 322
+           python hymn_catalog.py lookup --catalog hymn_catalog.sqlite --title "amazing grace"
+"""
+
+from __future__ import annotations
+import os
+import re
+import json
+import sqlite3
+import argparse
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+# ---- Config ----
+GENERAL_INDEX = "texts/general-index.txt"
+TOPICAL_INDEX = "texts/topical-index.txt"
+SONGS_JSON = "hymnal_songs.json"
+CATALOG_PATH = "hymn_catalog.sqlite"
+MAX_SONG_NUMBER = 700  # anything above this is an OCR error in the index
+
+ENTRY_RE = re.compile(r"^(?P<title>.*?)\s*>>\s*(?P<number>\d+)\s*$")
+HEADER_RE = re.compile(r"^\*\*(?P<name>.+?)\*\*$")
+SEE_RE = re.compile(r'^\((?:Also )?[Ss]ee ".*"\)$')
+# "Amazing Grace! how sweet the sound": a Title Cased title, then its first line in lowercase
+TITLE_SEP_RE = re.compile(r"\s*([:,!?;])\s+")
+SMALL_WORDS = {"a", "an", "and", "as", "at", "but", "by", "for", "from", "in", "into", "o", "of", "on", "or",
+               "the", "to", "with"}
+# "O Thou, whose own vast temple stands": a two-word address is the start of the title, not all of it
+VOCATIVE_WORDS = {"o", "oh", "thou", "thee", "ye", "lord", "god", "father", "saviour", "jesus"}
+
+
+def normalize_title(title: str) -> str:
+    """Lookup key for titles: lowercase letters/digits separated by single spaces."""
+    return " ".join(re.findall(r"[a-z0-9]+", title.lower().replace("'", "")))
+
+
+def parse_index(path: str) -> Tuple[List[Tuple[str, str, int]], List[Tuple[int, str, str]]]:
+    """
+    Parse an index file of `**Header**` lines followed by `Title >> number` lines.
+    Returns ([(header, title, number)], [(line_no, line, problem)]).
+    """
+    entries: List[Tuple[str, str, int]] = []
+    issues: List[Tuple[int, str, str]] = []
+    header = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, raw in enumerate(f, start=1):
+            line = raw.strip()
+            if not line or SEE_RE.match(line):
+                continue
+            m = HEADER_RE.match(line)
+            if m:
+                header = m.group("name")
+                continue
+            m = ENTRY_RE.match(line)
+            if m is None:
+                problem = "malformed '>>' entry" if ">>" in line else "missing '>>' song number"
+                issues.append((line_no, line, problem))
+                continue
+            number = int(m.group("number"))
+            if not 1 <= number <= MAX_SONG_NUMBER:
+                issues.append((line_no, line, f"song number {number} out of range"))
+                continue
+            entries.append((header, m.group("title").strip(), number))
+    return entries, issues
+
+
+def _is_title_case(text: str) -> bool:
+    words = re.findall(r"[A-Za-z][A-Za-z']*", text)
+    return bool(words) and words[0][0].isupper() and all(w[0].isupper() or w.lower() in SMALL_WORDS for w in words)
+
+
+def split_title(line: str) -> Optional[str]:
+    """
+    The title part of a general-index line that runs a title into its first line
+    ("Abide with Me: fast falls the eventide" -> "Abide with Me"), or None.
+    """
+    for sep in TITLE_SEP_RE.finditer(line):
+        title, rest = line[:sep.start()], line[sep.end():]
+        if len(title.split()) < 2 or not _is_title_case(title):
+            continue
+        if sep.group(1) == "," and len(title.split()) == 2 \
+                and any(w.lower() in VOCATIVE_WORDS for w in re.findall(r"[A-Za-z']+", title)):
+            continue
+        # The rest must read as a lowercase first line, not the title carrying on
+        # ("God Is Great, and God Is Good"). After ':' or '!' its first word may be
+        # capitalised ("He Leadeth Me: O blessed tho't!"); proper nouns allow a few more.
+        words = re.findall(r"[A-Za-z][A-Za-z']*", rest)
+        if not words or words[0][0].isupper() and sep.group(1) == ",":
+            continue
+        content = [w for w in words[1:] if w.lower() not in SMALL_WORDS]
+        if content and sum(w[0].isupper() for w in content) <= len(content) / 2:
+            return title
+    return None
+
+
+def _capitalization(title: str) -> float:
+    words = [w for w in re.findall(r"[A-Za-z']+", title) if len(w) > 3]
+    return sum(w[0].isupper() for w in words) / len(words) if words else 0.0
+
+
+def load_pages(songs_path: str) -> Dict[int, List[int]]:
+    """song_number -> page numbers, from the LLM-extracted songs JSON (if present)."""
+    if not os.path.exists(songs_path):
+        return {}
+    with open(songs_path, "r", encoding="utf-8") as f:
+        songs = json.load(f)
+    pages: Dict[int, List[int]] = defaultdict(list)
+    for s in songs:
+        number, p = s.get("song_number"), s.get("page_numbers")
+        if number is None or p is None:
+            continue
+        for page in (p if isinstance(p, list) else [p]):
+            if page not in pages[number]:
+                pages[number].append(page)
+    return pages
+
+
+def build_catalog(out_path: str = CATALOG_PATH, general_path: str = GENERAL_INDEX,
+                  topical_path: str = TOPICAL_INDEX, songs_path: str = SONGS_JSON) -> Dict:
+    general, general_issues = parse_index(general_path)
+    topical, topical_issues = parse_index(topical_path)
+
+    # Every general-index line is a title, a first line, or a title running into
+    # its first line, which is split so both are known. The topical index only
+    # lists titles, so a name found there wins; then a split-off title; otherwise
+    # take the most Title Cased.
+    topical_titles = {(normalize_title(t), n) for _, t, n in topical}
+    by_number: Dict[int, List[str]] = defaultdict(list)
+    split_titles = set()
+    for _, line, number in general:
+        title = split_title(line)
+        if title is not None:
+            split_titles.add((title, number))
+        for t in (title, line):
+            if t is not None and t not in by_number[number]:
+                by_number[number].append(t)
+    for _, title, number in topical:
+        if number not in by_number:
+            by_number[number].append(title)
+
+    issues = [("general", *i) for i in general_issues] + [("topical", *i) for i in topical_issues]
+    general_numbers = {n for _, _, n in general}
+    for title, number in sorted({(t, n) for _, t, n in topical if n not in general_numbers}, key=lambda e: e[1]):
+        issues.append(("topical", None, f"{title} >> {number}", "song number not in general index"))
+
+    pages = load_pages(songs_path)
+
+    tmp = out_path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    db.executescript("""
+        CREATE TABLE songs (number INTEGER PRIMARY KEY, title TEXT NOT NULL, pages TEXT NOT NULL);
+        CREATE TABLE titles (norm TEXT NOT NULL, title TEXT NOT NULL, number INTEGER NOT NULL, kind TEXT NOT NULL);
+        CREATE TABLE topics (topic TEXT NOT NULL, number INTEGER NOT NULL);
+        CREATE TABLE issues (source TEXT, line_no INTEGER, line TEXT, problem TEXT);
+        CREATE INDEX titles_norm ON titles(norm);
+        CREATE INDEX titles_number ON titles(number);
+        CREATE INDEX topics_topic ON topics(topic);
+        CREATE INDEX topics_number ON topics(number);
+    """)
+    for number, titles in sorted(by_number.items()):
+        canonical = max(titles, key=lambda t: ((normalize_title(t), number) in topical_titles,
+                                               (t, number) in split_titles, _capitalization(t)))
+        db.execute("INSERT INTO songs VALUES (?, ?, ?)", (number, canonical, json.dumps(pages.get(number, []))))
+        for t in titles:
+            db.execute("INSERT INTO titles VALUES (?, ?, ?, ?)",
+                       (normalize_title(t), t, number, "title" if t == canonical else "first_line"))
+    db.executemany("INSERT INTO topics VALUES (?, ?)", sorted({(topic, n) for topic, _, n in topical if topic}))
+    db.executemany("INSERT INTO issues VALUES (?, ?, ?, ?)", issues)
+    db.commit()
+    db.close()
+    os.replace(tmp, out_path)
+
+    return {"songs": len(by_number), "titles": sum(len(t) for t in by_number.values()),
+            "topics": len({topic for topic, _, _ in topical}), "issues": issues}
+
+
+class HymnCatalog:
+    """
+    Read-only view of a compiled catalog. The whole catalog is small (a few
+    hundred songs), so it is loaded into dicts for O(1) lookups.
+    """
+
+    def __init__(self, path: str = CATALOG_PATH):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Catalog not found: {path} (run `python hymn_catalog.py build`)")
+        db = sqlite3.connect(path)
+        self.songs: Dict[int, Dict] = {}
+        for number, title, pages in db.execute("SELECT number, title, pages FROM songs"):
+            self.songs[number] = {"number": number, "title": title, "alternate_titles": [],
+                                  "topics": [], "pages": json.loads(pages)}
+        self.by_title: Dict[str, List[int]] = defaultdict(list)
+        for norm, title, number, kind in db.execute("SELECT norm, title, number, kind FROM titles"):
+            if number not in self.by_title[norm]:
+                self.by_title[norm].append(number)
+            if kind != "title":
+                self.songs[number]["alternate_titles"].append(title)
+        self.by_topic: Dict[str, List[int]] = defaultdict(list)
+        for topic, number in db.execute("SELECT topic, number FROM topics ORDER BY topic, number"):
+            self.by_topic[topic].append(number)
+            if number in self.songs:
+                self.songs[number]["topics"].append(topic)
+        self.issues = db.execute("SELECT source, line_no, line, problem FROM issues").fetchall()
+        db.close()
+
+    def song(self, number: int) -> Optional[Dict]:
+        return self.songs.get(number)
+
+    def numbers_for_title(self, title: str) -> List[int]:
+        return self.by_title.get(normalize_title(title), [])
+
+    def numbers_for_topic(self, topic: str) -> List[int]:
+        return self.by_topic.get(topic, [])
+
+    def titles(self) -> List[Tuple[str, int]]:
+        """Every (title, number) pair, canonical titles and first lines alike."""
+        out = []
+        for s in self.songs.values():
+            out.append((s["title"], s["number"]))
+            out.extend((t, s["number"]) for t in s["alternate_titles"])
+        return out
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Compile and query the hymn catalog")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Compile the index text files into a catalog")
+    p_build.add_argument("--out", default=CATALOG_PATH)
+    p_build.add_argument("--general", default=GENERAL_INDEX)
+    p_build.add_argument("--topical", default=TOPICAL_INDEX)
+    p_build.add_argument("--songs", default=SONGS_JSON, help="Songs JSON used for page numbers")
+
+    p_lookup = sub.add_parser("lookup", help="Look a song up by number, title or topic")
+    p_lookup.add_argument("--catalog", default=CATALOG_PATH)
+    group = p_lookup.add_mutually_exclusive_group(required=True)
+    group.add_argument("--number", type=int)
+    group.add_argument("--title")
+    group.add_argument("--topic")
+
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        summary = build_catalog(args.out, args.general, args.topical, args.songs)
+        print(f"Compiled {summary['songs']} songs, {summary['titles']} titles and "
+              f"{summary['topics']} topics into {args.out}.")
+        if summary["issues"]:
+            print(f"{len(summary['issues'])} index entries need attention:")
+            for source, line_no, line, problem in summary["issues"]:
+                where = f"{source}:{line_no}" if line_no else source
+                print(f"  {where:14s} {problem}: {line}")
+
+    elif args.cmd == "lookup":
+        catalog = HymnCatalog(args.catalog)
+        if args.number is not None:
+            numbers = [args.number]
+        elif args.title:
+            numbers = catalog.numbers_for_title(args.title)
+        else:
+            numbers = catalog.numbers_for_topic(args.topic)
+        if not numbers:
+            print("No matches.")
+        for n in numbers:
+            print(json.dumps(catalog.song(n), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
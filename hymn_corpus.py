@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+hymn_corpus.py
+Compact hymn records with streaming JSONL storage and random access by number.
+
+hymns.json and hymnal_songs.json are pretty-printed arrays, so every reader has
+to json.load the whole book and every append rewrites the file. Here a corpus
+is a JSONL file, one record per line, read and written as a stream, plus a
+sidecar index (<file>.idx, a memory-mapped .npy of sorted (song_number, byte
+offset) pairs) that finds a hymn with a binary search and one seek+readline,
+without parsing anything else. Appends only index the new tail.
+
+Records use __slots__ with the fields of prompts/improved_prompt.md; fields a
+source never had are left unset, so hymnal_songs.json converts back byte for
+byte. hymns.json's raw {number, text} chunks become song_number/song_lyrics
+(number labels are normalised, "01" -> 1).
+
+Usage examples:
+  Convert:  python hymn_corpus.py import hymnal_songs.json --out hymnal_songs.jsonl
+  Legacy:   python hymn_corpus.py import hymns.json --out hymns.jsonl
+  One hymn: python hymn_corpus.py get hymnal_songs.jsonl 103
+  Back:     python hymn_corpus.py export hymnal_songs.jsonl --out hymnal_songs.json
+"""
+
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+# ---- Config ----
+SONG_FIELDS = ["song_number", "page_numbers", "song_title", "song_author", "song_date", "song_dates",
+               "song_bible_verse_reference", "song_bible_verse_text", "song_lyrics", "confidence_notes"]
+EXTRA_FIELDS = [
+    "song_category",  # filled by field_extractor from the running page header
+    "hymnal_id",  # set by corpus.py when several books are merged
+]
+INDEX_SUFFIX = ".idx"
+
+# Writers put song_number first, so the index can read it without a JSON parse.
+NUMBER_PREFIX_RE = re.compile(rb'^\{"song_number":\s*(-?\d+|null)[,}]')
+
+
+class HymnRecord:
+    """One hymn. Unset fields read as None and are left out of to_dict()."""
+
+    __slots__ = tuple(SONG_FIELDS + EXTRA_FIELDS)
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)  # AttributeError for unknown fields
+
+    def __getattr__(self, name):
+        # only reached for slots that were never assigned
+        if name in HymnRecord.__slots__:
+            return None
+        raise AttributeError(name)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HymnRecord":
+        unknown = set(data) - set(cls.__slots__)
+        if unknown:
+            raise ValueError(f"Unknown hymn fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    @classmethod
+    def from_legacy(cls, data: Dict) -> "HymnRecord":
+        """hymns.json entries: {"number": "7", "text": raw OCR chunk}."""
+        number = data.get("number")
+        return cls(song_number=int(number) if str(number).isdigit() else None, song_lyrics=data.get("text"))
+
+    def to_dict(self) -> Dict:
+        out = {}
+        for name in HymnRecord.__slots__:
+            try:
+                out[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return out
+
+    def to_legacy(self) -> Dict:
+        return {"number": "" if self.song_number is None else str(self.song_number), "text": self.song_lyrics or ""}
+
+    def __eq__(self, other):
+        return isinstance(other, HymnRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"HymnRecord({self.song_number!r}, {self.song_title!r})"
+
+
+def _dumps(record: HymnRecord) -> str:
+    return json.dumps(record.to_dict(), ensure_ascii=False, separators=(",", ":"))
+
+
+# ---- Streaming JSONL ----
+def read_jsonl(path: str) -> Iterator[HymnRecord]:
+    """Yield records one line at a time; memory stays flat whatever the corpus size."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield HymnRecord.from_dict(json.loads(line))
+
+
+def write_jsonl(path: str, records: Iterable[HymnRecord], append: bool = False) -> int:
+    """Write (or append) records and bring the index up to date. Returns the number written."""
+    n = 0
+    with open(path, "a" if append else "w", encoding="utf-8") as f:
+        for rec in records:
+            f.write(_dumps(rec) + "\n")
+            n += 1
+    if not append:
+        remove_index(path)
+    update_index(path)
+    return n
+
+
+# ---- Offset index ----
+# Row 0 holds [bytes covered, record count] and row 1 [file mtime_ns, digest of
+# the covered bytes]; the rest are (song_number, offset) pairs sorted by number
+# then offset. Records without a number are counted but not keyed. When the
+# file's mtime no longer matches, the covered bytes are re-hashed: an append
+# keeps them intact, a file copied or rewritten over the corpus does not.
+HEADER_ROWS = 2
+
+
+def _index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def remove_index(path: str):
+    if os.path.exists(_index_path(path)):
+        os.remove(_index_path(path))
+
+
+def _scan(path: str, start: int) -> Tuple[List[List[int]], int, int]:
+    """(song_number, offset) pairs for the records from byte `start` on."""
+    pairs, count = [], 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if line.strip():
+                count += 1
+                m = NUMBER_PREFIX_RE.match(line)
+                number = (None if m.group(1) == b"null" else int(m.group(1))) if m else \
+                    json.loads(line).get("song_number")
+                if isinstance(number, int):
+                    pairs.append([number, offset])
+            offset += len(line)
+    return pairs, count, offset
+
+
+def _digest(path: str, length: int) -> int:
+    """64-bit BLAKE2b of the first `length` bytes, as a signed int for the int64 index."""
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        while length > 0:
+            block = f.read(min(length, 1 << 20))
+            if not block:
+                break
+            h.update(block)
+            length -= len(block)
+    return int.from_bytes(h.digest(), "little", signed=True)
+
+
+def _empty_index() -> np.ndarray:
+    return np.zeros((HEADER_ROWS, 2), np.int64)
+
+
+def update_index(path: str) -> np.ndarray:
+    """Index records appended since the last update (or everything, if there is no valid index)."""
+    idx_path = _index_path(path)
+    stat = os.stat(path)
+    old = np.load(idx_path) if os.path.exists(idx_path) else None
+    if old is not None and len(old) >= HEADER_ROWS and int(old[1, 0]) == stat.st_mtime_ns \
+            and int(old[0, 0]) == stat.st_size:
+        return old
+    if old is None or len(old) < HEADER_ROWS or int(old[0, 0]) > stat.st_size \
+            or _digest(path, int(old[0, 0])) != int(old[1, 1]):
+        old = _empty_index()  # missing, or the file was replaced underneath us
+    covered, count = int(old[0, 0]), int(old[0, 1])
+    pairs, added, end = _scan(path, covered)
+    rows = np.concatenate([old[HEADER_ROWS:], np.asarray(pairs, np.int64).reshape(-1, 2)])
+    rows = rows[np.lexsort((rows[:, 1], rows[:, 0]))]
+    header = np.array([[end, count + added], [stat.st_mtime_ns, _digest(path, end)]], np.int64)
+    index = np.concatenate([header, rows])
+    tmp = idx_path + ".tmp.npy"
+    np.save(tmp, index)
+    os.replace(tmp, idx_path)
+    return index
+
+
+class HymnCorpus:
+    """
+    Random access into a JSONL corpus. The index is memory-mapped and looked up
+    with a binary search; fetching a hymn reads and parses only its own line.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        update_index(path)
+        index = np.load(_index_path(path), mmap_mode="r")
+        self.count = int(index[0, 1])
+        self.numbers = index[HEADER_ROWS:, 0]
+        self.offsets = index[HEADER_ROWS:, 1]
+        self._file = open(path, "rb")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _read_at(self, offset: int) -> HymnRecord:
+        self._file.seek(int(offset))
+        return HymnRecord.from_dict(json.loads(self._file.readline()))
+
+    def get_all(self, number: int, start: int = 0, end: Optional[int] = None) -> List[HymnRecord]:
+        """Records with this number, optionally only those in bytes [start, end) (one book of a merge)."""
+        lo, hi = np.searchsorted(self.numbers, [number, number + 1])
+        offsets = self.offsets[lo:hi]  # sorted, so a byte range is another binary search
+        lo, hi = np.searchsorted(offsets, [start, np.iinfo(np.int64).max if end is None else end])
+        return [self._read_at(o) for o in offsets[lo:hi]]
+
+    def get(self, number: int) -> Optional[HymnRecord]:
+        """First record with this song number (OCR'd books can repeat numbers)."""
+        lo = int(np.searchsorted(self.numbers, number))
+        if lo < len(self.numbers) and self.numbers[lo] == number:
+            return self._read_at(self.offsets[lo])
+        return None
+
+    def __contains__(self, number: int) -> bool:
+        lo = int(np.searchsorted(self.numbers, number))
+        return lo < len(self.numbers) and self.numbers[lo] == number
+
+    def song_numbers(self) -> List[int]:
+        return np.unique(self.numbers).tolist()
+
+    def __iter__(self) -> Iterator[HymnRecord]:
+        return read_jsonl(self.path)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---- Converters for the existing JSON files ----
+def from_json(json_path: str) -> List[HymnRecord]:
+    """Records from hymnal_songs.json (schema fields) or hymns.json ({number, text})."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [HymnRecord.from_legacy(d) if "text" in d and "song_number" not in d else HymnRecord.from_dict(d)
+            for d in data]
+
+
+def to_json(records: Iterable[HymnRecord], json_path: str, legacy: bool = False, ensure_ascii: bool = False) -> int:
+    """
+    Write a pretty-printed JSON array one record at a time, byte-for-byte what
+    json.dump(list, indent=2) gives, without building the list in memory.
+    """
+    n = 0
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for rec in records:
+            body = json.dumps(rec.to_legacy() if legacy else rec.to_dict(), ensure_ascii=ensure_ascii, indent=2)
+            f.write(("," if n else "") + "\n  " + body.replace("\n", "\n  "))
+            n += 1
+        f.write("\n]" if n else "]")
+    return n
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Hymn record store: JSONL with an offset index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_imp = sub.add_parser("import", help="Convert hymnal_songs.json or hymns.json to JSONL")
+    p_imp.add_argument("json")
+    p_imp.add_argument("--out", required=True)
+    p_imp.add_argument("--append", action="store_true", help="Append to an existing corpus")
+
+    p_exp = sub.add_parser("export", help="Write a corpus back out as a pretty-printed JSON array")
+    p_exp.add_argument("jsonl")
+    p_exp.add_argument("--out", required=True)
+    p_exp.add_argument("--legacy", action="store_true", help="hymns.json layout ({number, text})")
+    p_exp.add_argument("--ascii", action="store_true", help="Escape non-ASCII characters (as hymns.json does)")
+
+    p_get = sub.add_parser("get", help="Print the hymn(s) with a song number")
+    p_get.add_argument("jsonl")
+    p_get.add_argument("number", type=int)
+
+    p_idx = sub.add_parser("index", help="Rebuild the offset index")
+    p_idx.add_argument("jsonl")
+
+    args = parser.parse_args()
+
+    if args.cmd == "import":
+        n = write_jsonl(args.out, from_json(args.json), append=args.append)
+        print(f"{n} records → {args.out} (index {_index_path(args.out)})")
+
+    elif args.cmd == "export":
+        n = to_json(read_jsonl(args.jsonl), args.out, legacy=args.legacy, ensure_ascii=args.ascii)
+        print(f"{n} records → {args.out}")
+
+    elif args.cmd == "get":
+        with HymnCorpus(args.jsonl) as corpus:
+            records = corpus.get_all(args.number)
+        if not records:
+            sys.exit(f"No hymn {args.number} in {args.jsonl}")
+        for rec in records:
+            print(json.dumps(rec.to_dict(), ensure_ascii=False, indent=2))
+
+    elif args.cmd == "index":
+        remove_index(args.jsonl)
+        index = update_index(args.jsonl)
+        print(f"Indexed {len(index) - HEADER_ROWS} numbered of {int(index[0, 1])} records in {args.jsonl}")
+
+
+if __name__ == "__main__":
+    main()
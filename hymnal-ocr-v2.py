@@ -9,30 +9,38 @@ from PIL import Image
 import numpy as np
 import cv2
 import io
+import argparse
 import matplotlib.pyplot as plt
+import instrument
+from ocr_store import OCRStoreWriter, ocr_fields
 
 
 # ============================================================
 # 1) PDF → HIGH-QUALITY IMAGES
 # ============================================================
 
-def pdf_to_images(pdf_path, dpi=350):
+def iter_page_images(pdf_path, dpi=350, pages=None):
     """
-    Convert PDF pages into high-DPI images (critical for accuracy).
+    Render PDF pages one at a time as (page number, high-DPI image), so only the
+    page being worked on is in memory.
+    `pages` is an inclusive, 1-based (first, last) range; default all pages.
     """
-    pdf = fitz.open(pdf_path)
-    images = []
-
-    for i in range(pdf.page_count):
-        page = pdf[i]
+    with fitz.open(pdf_path) as pdf:
+        first, last = pages or (1, pdf.page_count)
         mat = fitz.Matrix(dpi/72, dpi/72)
-        pix = page.get_pixmap(matrix=mat)
+        for i in range(first - 1, min(last, pdf.page_count)):
+            with instrument.timer("render", page=i + 1):
+                pix = pdf[i].get_pixmap(matrix=mat)
+                img = Image.open(io.BytesIO(pix.tobytes("png")))
+            yield i + 1, img
 
-        img = Image.open(io.BytesIO(pix.tobytes("png")))
-        images.append(img)
 
-    pdf.close()
-    return images
+def pdf_to_images(pdf_path, dpi=350, pages=None):
+    """
+    Convert PDF pages into high-DPI images (critical for accuracy).
+    `pages` is an inclusive, 1-based (first, last) range; default all pages.
+    """
+    return [img for _, img in iter_page_images(pdf_path, dpi=dpi, pages=pages)]
 
 
 # ============================================================
@@ -85,21 +93,40 @@ def init_ocr():
 # 4) RUN OCR ON ALL PAGES
 # ============================================================
 
-def process_pdf(pdf_path):
-    ocr = init_ocr()
-    pages = pdf_to_images(pdf_path)
+def process_pdf(pdf_path, store=None, pages=None, keep_images=False):
+    """
+    OCR every page, or only the (first, last) range in `pages` (one shard of a
+    bigger job). Pages are rendered one at a time. If `store` (an OCRStoreWriter)
+    is given, each page's raw boxes, texts and scores are appended to it as soon
+    as OCR finishes.
+    keep_images=True keeps each page image and the full OCRResult (which holds
+    the preprocessed image too) for visualize_result; otherwise a page keeps only
+    its boxes, texts and scores.
+    """
+    with instrument.timer("init_ocr"):
+        ocr = init_ocr()
+    with fitz.open(pdf_path) as pdf:
+        first, last = pages or (1, pdf.page_count)
+        total = min(last, pdf.page_count) - first + 1
     results = []
 
-    for idx, img in enumerate(pages):
-        print(f"Processing page {idx+1}/{len(pages)}...")
+    for idx, (page_no, img) in enumerate(iter_page_images(pdf_path, pages=pages)):
+        print(f"Processing page {page_no} ({idx+1}/{total})...")
 
-        cleaned = preprocess(img)
-        result = ocr.predict(cleaned)
+        with instrument.timer("preprocess", page=page_no):
+            cleaned = preprocess(img)
+        with instrument.timer("ocr", page=page_no):
+            result = ocr.predict(cleaned)
+        instrument.count("pages")
+        instrument.count("boxes", len(result[0].get("rec_texts", [])))
+        if store is not None:
+            store.add_page(page_no, result[0], size=img.size)
 
         results.append({
-            "page": idx+1,
-            "image": img,
-            "ocr": result[0]   # The OCRResult object
+            "page": page_no,
+            "image": img if keep_images else None,
+            "ocr": result[0] if keep_images else dict(zip(("rec_polys", "rec_texts", "rec_scores"),
+                                                           ocr_fields(result[0])))
         })
 
     return results
@@ -118,7 +145,8 @@ def extract_text(results):
 
         print(f"\n--- Page {page} ---")
 
-        for text, score in zip(ocr_obj.text, ocr_obj.scores):
+        _, texts, scores = ocr_fields(ocr_obj)
+        for text, score in zip(texts, scores):
             print(f"{text} (conf {score:.2f})")
             all_text.append(text)
 
@@ -159,18 +187,32 @@ def visualize_result(result):
 # ============================================================
 
 if __name__ == "__main__":
-    pdf_path = "christianhymnal.pdf"
+    parser = argparse.ArgumentParser(description="High-accuracy hymnal OCR")
+    parser.add_argument("--pdf", default="christianhymnal.pdf")
+    parser.add_argument("--ocr-store", help="Also write raw OCR boxes/texts/scores to this store directory")
+    parser.add_argument("--pages", help="Only OCR this inclusive page range, e.g. 41-60 (see corpus.py shard)")
+    parser.add_argument("--out", default="texts/hymnal-text-v2.txt")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.metrics)
 
     print("Starting high-accuracy OCR...")
-    results = process_pdf(pdf_path)
+    store = OCRStoreWriter(args.ocr_store, source=args.pdf, dpi=350) if args.ocr_store else None
+    try:
+        with instrument.profile(args.profile):
+            pages = tuple(int(p) for p in args.pages.split("-")) if args.pages else None
+            results = process_pdf(args.pdf, store=store, pages=pages)
+    finally:
+        if store is not None:
+            store.close()
 
     extracted = extract_text(results)
 
-    with open("texts/hymnal-text-v2.txt", "w", encoding="utf-8") as f:
+    with open(args.out, "w", encoding="utf-8") as f:
         f.write(extracted)
 
     print("\nOCR complete.")
     print(f"Processed {len(results)} pages.")
-    print("Saved output to texts/extracted_text.txt")
+    print(f"Saved output to {args.out}")
 
-    # visualize_result(results[0])  # enable if you want
+    # visualize_result(results[0])  # enable if you want (needs process_pdf(..., keep_images=True))
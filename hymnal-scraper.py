@@ -10,6 +10,9 @@ import matplotlib.patches as patches
 from matplotlib.patches import Polygon
 import numpy as np
 import cv2
+import argparse
+import instrument
+from ocr_store import OCRStoreWriter
 
 def pdf_to_images(pdf_path, dpi=350):
     """
@@ -32,16 +35,21 @@ def pdf_to_images(pdf_path, dpi=350):
     pdf_document.close()
     return images
 
-def process_pdf_with_ocr(pdf_path, lang='en'):
+def process_pdf_with_ocr(pdf_path, lang='en', store=None, keep_images=True):
     """
     Process PDF with OCR and return results for all pages
+    If store (an OCRStoreWriter) is given, raw OCR output is appended to it per page.
+    keep_images=False drops the page images from the results (they are only
+    needed by visualize_pdf_results).
     """
     # Initialize PaddleOCR with updated parameters
     # Note: use_gpu parameter is not used in this version of the API
-    ocr = PaddleOCR(lang=lang, use_textline_orientation=True) 
+    with instrument.timer("init_ocr"):
+        ocr = PaddleOCR(lang=lang, use_textline_orientation=True) 
     
     # Convert PDF to images
-    images = pdf_to_images(pdf_path)
+    with instrument.timer("render"):
+        images = pdf_to_images(pdf_path)
     results = []
     
     for i, img in enumerate(images):
@@ -56,10 +64,14 @@ def process_pdf_with_ocr(pdf_path, lang='en'):
         
         # Perform OCR using the new predict method
         # The result is a list containing an OCRResult object (dict-like)
-        result = ocr.predict(img_array)
+        with instrument.timer("ocr", page=i+1):
+            result = ocr.predict(img_array)
+        instrument.count("pages")
+        if store is not None and result:
+            store.add_page(i+1, result[0], size=img.size)
         results.append({
             'page': i+1,
-            'image': img,
+            'image': img if keep_images else None,
             'ocr_result': result # Keep the full result list
         })
     
@@ -149,18 +161,30 @@ def extract_text_from_pdf_results(results):
 
 # Main execution
 if __name__ == "__main__":
-    # Replace with your PDF file path
-    pdf_path = 'christianhymnal.pdf'
+    parser = argparse.ArgumentParser(description="PDF OCR with PaddleOCR")
+    parser.add_argument("--pdf", default="christianhymnal.pdf")
+    parser.add_argument("--ocr-store", help="Also write raw OCR boxes/texts/scores to this store directory")
+    parser.add_argument("--visualize", action="store_true", help="Show each page with its boxes")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.metrics)
     
     # Process PDF with OCR
     print("Starting PDF OCR processing...")
-    results = process_pdf_with_ocr(pdf_path, lang='en')
+    store = OCRStoreWriter(args.ocr_store, source=args.pdf, dpi=350) if args.ocr_store else None
+    try:
+        with instrument.profile(args.profile):
+            results = process_pdf_with_ocr(args.pdf, lang='en', store=store, keep_images=args.visualize)
+    finally:
+        if store is not None:
+            store.close()
     
     # Extract and print text
     full_text = extract_text_from_pdf_results(results)
     
-    # Optional: Visualize results (comment out if not needed)
-    # visualize_pdf_results(results)
+    # Optional: Visualize results
+    if args.visualize:
+        visualize_pdf_results(results)
     
     # Save extracted text to file
     with open('texts/htext-v2.txt', 'w', encoding='utf-8') as f:
@@ -168,4 +192,4 @@ if __name__ == "__main__":
     
     print("\nOCR processing complete!")
     print(f"Total pages processed: {len(results)}")
-    print("Text saved to 'extracted_text.txt'")
\ No newline at end of file
+    print("Text saved to 'texts/htext-v2.txt'")
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+instrument.py
+Lightweight per-stage metrics shared by the pipeline scripts.
+
+  with instrument.timer("ocr", page=3):   # wall time + RSS for a block
+      ...
+  instrument.count("boxes", 120)          # counters, summed and written at exit
+
+Metrics are appended as JSON lines to the file given by --metrics or the
+HYMNAL_METRICS environment variable. When neither is set, timer() returns a
+shared no-op object and count() returns immediately, so instrumented code pays
+only a function call. profile() wraps a run in cProfile and prints the top
+hot spots.
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import resource
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+METRICS_ENV = "HYMNAL_METRICS"
+PROFILE_TOP = 25  # hot spots printed after a --profile run
+
+_sink = None
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size (Linux /proc only; None elsewhere)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return round(int(f.read().split()[1]) * _page_size / (1024 * 1024), 1)
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def configure(path: Optional[str] = None):
+    """Start writing metrics to `path` (or $HYMNAL_METRICS). No-op if neither is set."""
+    global _sink
+    path = path or os.environ.get(METRICS_ENV)
+    if not path or _sink is not None:
+        return
+    _sink = open(path, "a", encoding="utf-8")
+    emit({"type": "start", "argv": sys.argv})
+    atexit.register(close)
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def emit(record: Dict):
+    if _sink is None:
+        return
+    record.setdefault("ts", time.time())
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _lock:
+        _sink.write(line + "\n")
+
+
+def close():
+    """Write counters and the process peak RSS, then close the sink."""
+    global _sink
+    if _sink is None:
+        return
+    for name, value in sorted(_counters.items()):
+        emit({"type": "counter", "name": name, "value": value})
+    emit({"type": "end", "peak_rss_mb": round(peak_rss_mb(), 1)})
+    _sink.close()
+    _sink = None
+    _counters.clear()
+
+
+class _Timer:
+    __slots__ = ("name", "fields", "start")
+
+    def __init__(self, name: str, fields: Dict):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record = {"type": "timer", "name": self.name,
+                  "ms": round((time.perf_counter() - self.start) * 1000, 3),
+                  "rss_mb": rss_mb(), "peak_rss_mb": round(peak_rss_mb(), 1)}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.fields)
+        emit(record)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name: str, **fields):
+    """Context manager timing a block; extra keyword fields are stored with it."""
+    if _sink is None:
+        return _NULL_TIMER
+    return _Timer(name, fields)
+
+
+def count(name: str, n: float = 1):
+    if _sink is None:
+        return
+    with _lock:
+        _counters[name] += n
+
+
+def add_arguments(parser):
+    """Adds --metrics and --profile to a script's argparse parser."""
+    parser.add_argument("--metrics", help=f"Append stage metrics as JSONL to this file (or set ${METRICS_ENV})")
+    parser.add_argument("--profile", nargs="?", const="profile.prof", metavar="OUT",
+                        help="Run under cProfile, save stats to OUT and print the top hot spots")
+
+
+@contextmanager
+def profile(out_path: Optional[str] = None, top: int = PROFILE_TOP):
+    """cProfile the enclosed block when out_path is set; otherwise do nothing."""
+    if not out_path:
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(out_path)
+        print(f"\nProfile saved to {out_path}; top {top} by cumulative time:")
+        pstats.Stats(prof).strip_dirs().sort_stats("cumulative").print_stats(top)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+live_hymn_id.py
+Identify the hymn being sung from a live audio feed.
+
+Audio is read as raw 16 kHz mono s16le PCM, kept in a rolling buffer and
+transcribed in overlapping windows with a small Whisper model. Each window's
+transcript is scored against the lyrics in hymnal_songs.json and added to a
+decaying running score; the hymn number is published once it clearly leads.
+
+Usage examples:
+  Live capture:  ffmpeg -f pulse -i default -ac 1 -ar 16000 -f s16le - | python live_hymn_id.py stdin
+  Growing file:  python live_hymn_id.py follow --path capture.pcm
+  Replay mp3:    python live_hymn_id.py replay --mp3 service.mp3 --metrics latency.jsonl
+"""
+
+from __future__ import annotations
+import os
+import re
+import sys
+import json
+import math
+import time
+import queue
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+# ---- Config ----
+SAMPLE_RATE = 16000
+BYTES_PER_SAMPLE = 2  # s16le
+WINDOW_SECONDS = 6.0  # audio transcribed per decision
+HOP_SECONDS = 2.0  # new audio needed before the next decision
+WHISPER_MODEL = "base"  # small models keep up with real time on CPU
+LANGUAGE = "en"
+SONGS_JSON = "hymnal_songs.json"
+SCORE_DECAY = 0.85  # weight kept by older windows at every hop
+MIN_EVIDENCE = 15.0  # accumulated score the leader needs before publishing
+CONFIDENCE_THRESHOLD = 0.5  # 1 - runner_up / leader
+LATENCY_BUDGET = 3.0  # seconds from audio arrival to decision
+READ_BLOCK = 3200  # bytes per read (0.1 s of audio)
+
+# ---- Lyrics scoring ----
+WORD_RE = re.compile(r"[a-z']+")
+
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercase word list with OCR syllable hyphens ("Al - might - y") rejoined."""
+    text = re.sub(r"\s*-\s*", "", text.lower())
+    return [w.strip("'") for w in WORD_RE.findall(text) if w.strip("'")]
+
+
+def load_hymns(path: str = SONGS_JSON) -> List[Dict]:
+    """Return [{"number", "title", "words"}] for every song that has lyrics."""
+    with open(path, "r", encoding="utf-8") as f:
+        return hymns_from_songs(json.load(f))
+
+
+def hymns_from_songs(songs: List[Dict]) -> List[Dict]:
+    """Same, for songs already loaded; "index" points back into `songs`."""
+    hymns: List[Dict] = []
+    for i, s in enumerate(songs):
+        words = normalize_words((s.get("song_title") or "") + "\n" + (s.get("song_lyrics") or ""))
+        if words:
+            hymns.append({"number": s.get("song_number"), "title": s.get("song_title"), "words": words, "index": i})
+    return hymns
+
+
+class HymnScorer:
+    """IDF-weighted word-bigram overlap between a transcript and every hymn."""
+
+    def __init__(self, hymns: List[Dict]):
+        self.hymns = hymns
+        self.postings: Dict[Tuple[str, str], List[int]] = defaultdict(list)
+        for hid, h in enumerate(hymns):
+            for bg in set(zip(h["words"], h["words"][1:])):
+                self.postings[bg].append(hid)
+        n = len(hymns)
+        self.idf = {bg: math.log(1 + n / len(ids)) for bg, ids in self.postings.items()}
+
+    def score(self, text: str) -> Dict[int, float]:
+        words = normalize_words(text)
+        scores: Dict[int, float] = defaultdict(float)
+        for bg in set(zip(words, words[1:])):
+            for hid in self.postings.get(bg, ()):
+                scores[hid] += self.idf[bg]
+        return scores
+
+
+class HymnAccumulator:
+    """Running, exponentially decayed hymn scores with a publish rule."""
+
+    def __init__(self, decay: float = SCORE_DECAY, min_evidence: float = MIN_EVIDENCE,
+                 threshold: float = CONFIDENCE_THRESHOLD):
+        self.decay = decay
+        self.min_evidence = min_evidence
+        self.threshold = threshold
+        self.scores: Dict[int, float] = defaultdict(float)
+        self.published: Optional[int] = None
+
+    def update(self, window_scores: Dict[int, float]) -> Tuple[Optional[int], float]:
+        """Fold in one window. Returns (leader, confidence)."""
+        for hid in list(self.scores):
+            self.scores[hid] *= self.decay
+            if self.scores[hid] < 1e-3:
+                del self.scores[hid]
+        for hid, s in window_scores.items():
+            self.scores[hid] += s
+        if not self.scores:
+            return None, 0.0
+        ranked = sorted(self.scores.items(), key=lambda kv: kv[1], reverse=True)
+        leader, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        confidence = 1.0 - runner_up / top if top > 0 else 0.0
+        return leader, confidence
+
+    def should_publish(self, leader: Optional[int], confidence: float) -> bool:
+        if leader is None or leader == self.published:
+            return False
+        return self.scores[leader] >= self.min_evidence and confidence >= self.threshold
+
+
+# ---- Audio sources ----
+# Each source yields (pcm_bytes, arrival_wall_time).
+
+def read_stream(stream) -> Iterator[Tuple[bytes, float]]:
+    while True:
+        data = stream.read(READ_BLOCK)
+        if not data:
+            return
+        yield data, time.monotonic()
+
+
+def follow_file(path: str, idle_timeout: float = 10.0) -> Iterator[Tuple[bytes, float]]:
+    """Tail a file that another process keeps appending PCM to."""
+    with open(path, "rb") as f:
+        last_data = time.monotonic()
+        while True:
+            data = f.read(READ_BLOCK)
+            if data:
+                last_data = time.monotonic()
+                yield data, last_data
+            elif time.monotonic() - last_data > idle_timeout:
+                return
+            else:
+                time.sleep(0.05)
+
+
+def replay_mp3(mp3_path: str) -> Iterator[Tuple[bytes, float]]:
+    """Decode an mp3 with ffmpeg at real-time speed (-re), as if it were live."""
+    proc = subprocess.Popen([
+        "ffmpeg", "-re", "-i", str(mp3_path),
+        "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "-",
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        yield from read_stream(proc.stdout)
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+# ---- Live loop ----
+class RollingBuffer:
+    """Fixed-size float32 buffer holding the most recent window of audio."""
+
+    def __init__(self, seconds: float = WINDOW_SECONDS):
+        self.samples = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+        self.total = 0  # samples received since start
+        self._carry = b""  # odd trailing byte from the last block
+
+    def push(self, data: bytes) -> int:
+        data = self._carry + data
+        cut = len(data) - len(data) % BYTES_PER_SAMPLE
+        self._carry = data[cut:]
+        new = np.frombuffer(data[:cut], dtype="<i2").astype(np.float32) / 32768.0
+        n = len(new)
+        if n >= len(self.samples):
+            self.samples[:] = new[-len(self.samples):]
+        elif n:
+            self.samples[:-n] = self.samples[n:]
+            self.samples[-n:] = new
+        self.total += n
+        return n
+
+
+def run_live(source: Iterator[Tuple[bytes, float]], scorer: HymnScorer, model,
+             accumulator: HymnAccumulator, metrics_path: Optional[str] = None,
+             publish_path: Optional[str] = None, latency_budget: float = LATENCY_BUDGET) -> Dict:
+    """Consume audio blocks until the source ends; return a latency summary."""
+    blocks: "queue.Queue[Optional[Tuple[bytes, float]]]" = queue.Queue()
+
+    def reader():
+        for item in source:
+            blocks.put(item)
+        blocks.put(None)
+
+    threading.Thread(target=reader, daemon=True).start()
+
+    buf = RollingBuffer()
+    hop = int(HOP_SECONDS * SAMPLE_RATE)
+    next_decision = len(buf.samples)  # wait for one full window first
+    latencies: List[float] = []
+    over_budget = 0
+    skipped = 0
+    metrics = open(metrics_path, "a", encoding="utf-8") if metrics_path else None
+    finished = False
+
+    try:
+        while not finished:
+            # Block for at least one chunk, then drain everything already queued so we
+            # always decide on the freshest audio instead of falling further behind.
+            item = blocks.get()
+            last_arrival = None
+            while item is not None:
+                buf.push(item[0])
+                last_arrival = item[1]
+                try:
+                    item = blocks.get_nowait()
+                except queue.Empty:
+                    break
+            if item is None:
+                finished = True
+            if last_arrival is None or buf.total < next_decision:
+                continue
+            skipped += max(0, (buf.total - next_decision) // hop)
+            next_decision = buf.total + hop
+
+            t0 = time.monotonic()
+            result = model.transcribe(buf.samples.copy(), language=LANGUAGE, fp16=False,
+                                      condition_on_previous_text=False)
+            t1 = time.monotonic()
+            leader, confidence = accumulator.update(scorer.score(result["text"]))
+            t2 = time.monotonic()
+
+            latency = t2 - last_arrival
+            latencies.append(latency)
+            if latency > latency_budget:
+                over_budget += 1
+
+            record = {
+                "audio_end_s": round(buf.total / SAMPLE_RATE, 3),
+                "transcribe_ms": round((t1 - t0) * 1000, 1),
+                "score_ms": round((t2 - t1) * 1000, 3),
+                "latency_ms": round(latency * 1000, 1),
+                "leader": None if leader is None else scorer.hymns[leader]["number"],
+                "confidence": round(confidence, 3),
+                "text": result["text"].strip(),
+            }
+            if accumulator.should_publish(leader, confidence):
+                accumulator.published = leader
+                hymn = scorer.hymns[leader]
+                record["published"] = hymn["number"]
+                print(f"♪ Hymn {hymn['number']}: {hymn['title']} "
+                      f"(conf {confidence:.2f}, latency {latency:.2f}s)", flush=True)
+                if publish_path:
+                    tmp = publish_path + ".tmp"
+                    with open(tmp, "w", encoding="utf-8") as f:
+                        json.dump({"song_number": hymn["number"], "song_title": hymn["title"],
+                                   "confidence": confidence, "time": time.time()}, f)
+                    os.replace(tmp, publish_path)
+            if metrics:
+                metrics.write(json.dumps(record, ensure_ascii=False) + "\n")
+                metrics.flush()
+    finally:
+        if metrics:
+            metrics.close()
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "decisions": len(latencies),
+        "skipped_windows": int(skipped),
+        "over_budget": over_budget,
+        "latency_p50_s": float(np.percentile(lat, 50)),
+        "latency_p95_s": float(np.percentile(lat, 95)),
+        "latency_max_s": float(lat.max()),
+    }
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Live hymn identification from a rolling audio window")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("stdin", help="Read s16le 16 kHz mono PCM from stdin")
+    p_follow = sub.add_parser("follow", help="Tail a growing PCM file")
+    p_follow.add_argument("--path", required=True)
+    p_replay = sub.add_parser("replay", help="Replay an mp3 at real-time speed")
+    p_replay.add_argument("--mp3", required=True)
+    for p in sub.choices.values():
+        p.add_argument("--songs", default=SONGS_JSON)
+        p.add_argument("--model", default=WHISPER_MODEL)
+        p.add_argument("--metrics", help="Append one JSON line per decision to this file")
+        p.add_argument("--publish", help="Write the current hymn as JSON to this file for a display")
+        p.add_argument("--budget", type=float, default=LATENCY_BUDGET, help="Latency budget in seconds")
+        p.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD)
+
+    args = parser.parse_args()
+
+    if args.cmd == "stdin":
+        source = read_stream(sys.stdin.buffer)
+    elif args.cmd == "follow":
+        source = follow_file(args.path)
+    else:
+        source = replay_mp3(args.mp3)
+
+    scorer = HymnScorer(load_hymns(args.songs))
+    import whisper  # deferred so the scorer can be imported without Whisper installed
+    model = whisper.load_model(args.model)
+    accumulator = HymnAccumulator(threshold=args.threshold)
+    print(f"Listening ({len(scorer.hymns)} hymns, {WINDOW_SECONDS:.0f}s window, {HOP_SECONDS:.0f}s hop)…")
+
+    summary = run_live(source, scorer, model, accumulator, metrics_path=args.metrics,
+                       publish_path=args.publish, latency_budget=args.budget)
+    print(f"{summary['decisions']} decisions, p50 latency {summary['latency_p50_s']:.2f}s, "
+          f"p95 {summary['latency_p95_s']:.2f}s, {summary['over_budget']} over the "
+          f"{args.budget:.1f}s budget, {summary['skipped_windows']} windows skipped to keep up")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+lyric_layout.py
+Rebuild lyric lines from PaddleOCR boxes using page geometry.
+
+PaddleOCR returns words and syllables as separate boxes in detection order,
+which is how "1. Come, Thou Al / - might / - y / King" ends up scrambled in the
+extracted text. Here boxes are grouped into rows by their vertical centres,
+ordered left to right, and hyphenated syllables are joined. Under each staff
+the verses are stacked one row per verse, so blocks of rows that follow a
+"1." / "2." / ... block are interleaved back into whole verses.
+
+Usage examples:
+  From a store:  python lyric_layout.py --store ocr_store --out texts/lyric_lines.jsonl
+  Some pages:    python lyric_layout.py --store ocr_store --pages 11-20
+"""
+
+from __future__ import annotations
+import re
+import sys
+import json
+import argparse
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+
+from ocr_store import OCRStore
+
+# ---- Config ----
+MIN_SCORE = 0.5  # boxes below this recognition score are dropped
+MAX_HEIGHT_FACTOR = 2.5  # boxes taller than this x median height are notation, not text
+ROW_GAP_FACTOR = 0.5  # new row when the centre moves down more than this x median height
+BLOCK_GAP_FACTOR = 1.6  # new block when the row pitch exceeds this x median pitch
+
+VERSE_RE = re.compile(r"^(\d{1,2})\.\s*")
+LETTERS_RE = re.compile(r"[A-Za-z]{2,}")
+TOKEN_RE = re.compile(r"[A-Za-z]|^\s*-\s*$|^\s*\d{1,2}\.\s*$")  # words, bare hyphens, verse numbers
+
+
+def join_syllables(tokens: List[str], strip_dangling: bool = True) -> str:
+    """
+    Join a left-to-right row of tokens, merging syllables split by hyphens
+    ("Al", "- might", "- y", "King," -> "Almighty King,"). Hyphens without
+    spaces inside one token ("white-robed") are kept, since they may be real.
+    A hyphen left at the end of a row is kept unless strip_dangling is set, so
+    the syllable can still be joined to the verse's next row.
+    """
+    text = " ".join(t.strip() for t in tokens if t.strip())
+    text = re.sub(r"(?<=\w)\s+-\s*(?=\w)|(?<=\w)\s*-\s+(?=\w)", "", text)
+    if strip_dangling:
+        text = re.sub(r"\s*-\s*$|^\s*-\s*", "", text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+
+def _rows(y_center: np.ndarray, height: float) -> np.ndarray:
+    """Row id per box (in y-sorted order): a row breaks where the centres jump."""
+    return np.concatenate([[0], np.cumsum(np.diff(y_center) > ROW_GAP_FACTOR * height)])
+
+
+def reconstruct_page(polys, texts: List[str], scores=None) -> List[Dict]:
+    """
+    Return lyric lines for one page, top to bottom:
+      [{"text", "bbox": [x0, y0, x1, y1], "verse": int | None}]
+    """
+    polys = np.asarray(polys, dtype=np.float32).reshape(-1, 4, 2)
+    n = len(polys)
+    if n == 0:
+        return []
+    scores = np.ones(n, np.float32) if scores is None else np.asarray(scores, dtype=np.float32)
+    x0, y0 = polys[:, :, 0].min(axis=1), polys[:, :, 1].min(axis=1)
+    x1, y1 = polys[:, :, 0].max(axis=1), polys[:, :, 1].max(axis=1)
+    h = y1 - y0
+
+    has_text = np.fromiter((bool(TOKEN_RE.search(t)) for t in texts), bool, n)
+    med_h = float(np.median(h[has_text])) if has_text.any() else float(np.median(h))
+    keep = has_text & (scores >= MIN_SCORE) & (h <= MAX_HEIGHT_FACTOR * med_h)
+    idx = np.flatnonzero(keep)
+    if len(idx) == 0:
+        return []
+
+    # One O(n log n) sort by centre, a vectorised row split, then x order within rows.
+    yc = (y0[idx] + y1[idx]) / 2
+    idx = idx[np.argsort(yc, kind="stable")]
+    row = _rows((y0[idx] + y1[idx]) / 2, med_h)
+    idx = idx[np.lexsort((x0[idx], row))]
+    row = np.sort(row)
+    bounds = np.flatnonzero(np.diff(row)) + 1
+
+    lines = []
+    for r in np.split(idx, bounds):
+        text = join_syllables([texts[i] for i in r], strip_dangling=False)
+        if not LETTERS_RE.search(text):
+            continue
+        lines.append({
+            "text": text,
+            "bbox": [float(x0[r].min()), float(y0[r].min()), float(x1[r].max()), float(y1[r].max())],
+            "verse": None,
+        })
+    assign_verses(lines)
+    return lines
+
+
+def assign_verses(lines: List[Dict]):
+    """
+    Group rows into blocks by vertical pitch. A block whose rows start "1.", "2."...
+    fixes the verse count V; every later block of exactly V rows is interleaved,
+    row k going to verse k. Other rows (titles, refrains, credits) stay unassigned.
+    """
+    if len(lines) < 2:
+        return
+    centers = np.array([(l["bbox"][1] + l["bbox"][3]) / 2 for l in lines])
+    pitch = np.diff(centers)
+    breaks = np.flatnonzero(pitch > BLOCK_GAP_FACTOR * np.median(pitch)) + 1
+    verses = 0
+    for block in np.split(np.arange(len(lines)), breaks):
+        numbers = [VERSE_RE.match(lines[i]["text"]) for i in block]
+        if len(block) > 1 and all(numbers) and [int(m.group(1)) for m in numbers] == list(range(1, len(block) + 1)):
+            verses = len(block)
+        elif verses < 2 or len(block) != verses:
+            continue
+        for k, i in enumerate(block, start=1):
+            lines[i]["verse"] = k
+            lines[i]["text"] = VERSE_RE.sub("", lines[i]["text"])
+
+
+def verses_text(lines: List[Dict]) -> Dict[int, str]:
+    """Whole verses, each row of a verse joined in reading order."""
+    out: Dict[int, List[str]] = {}
+    for l in lines:
+        if l["verse"] is not None:
+            out.setdefault(l["verse"], []).append(l["text"])
+    return {v: join_syllables(rows) for v, rows in sorted(out.items())}
+
+
+def parse_pages(spec: Optional[str]) -> Optional[set]:
+    """"1-5,9" -> {1, 2, 3, 4, 5, 9}"""
+    if not spec:
+        return None
+    pages = set()
+    for part in spec.split(","):
+        a, _, b = part.partition("-")
+        pages.update(range(int(a), int(b or a) + 1))
+    return pages
+
+
+def reconstruct_store(store: OCRStore, pages: Optional[Iterable[int]] = None) -> Iterable[Dict]:
+    wanted = set(pages) if pages else None
+    for p in store.pages:
+        if wanted is not None and p not in wanted:
+            continue
+        page = store.page(p)
+        lines = reconstruct_page(page["dt_polys"], page["rec_texts"], page["rec_scores"])
+        yield {"page": p, "lines": lines, "verses": verses_text(lines)}
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Geometry-based lyric line reconstruction")
+    parser.add_argument("--store", required=True, help="OCR store written with --ocr-store")
+    parser.add_argument("--pages", help="Page ranges, e.g. 11-20,25")
+    parser.add_argument("--out", help="JSONL output (default: stdout)")
+    args = parser.parse_args()
+
+    store = OCRStore(args.store)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    n_pages = n_lines = 0
+    for result in reconstruct_store(store, parse_pages(args.pages)):
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        n_pages += 1
+        n_lines += len(result["lines"])
+    if args.out:
+        out.close()
+        print(f"Rebuilt {n_lines} lines from {store.meta['n_boxes']} boxes over {n_pages} pages → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
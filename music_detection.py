@@ -1,15 +1,15 @@
 import os
+import argparse
 import librosa
 import numpy as np
 import soundfile as sf
 from pydub import AudioSegment
+import instrument
 
 INPUT_DIR = "mp3s"
 OUTPUT_DIR = "music_chunks"
 CHUNK_SECONDS = 20
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
 
 def is_music(y, sr):
     """
@@ -35,7 +35,8 @@ def is_music(y, sr):
 
 
 def split_mp3(path):
-    audio = AudioSegment.from_mp3(path)
+    with instrument.timer("decode_mp3", file=os.path.basename(path)):
+        audio = AudioSegment.from_mp3(path)
     duration_ms = len(audio)
 
     chunk_ms = CHUNK_SECONDS * 1000
@@ -49,7 +50,11 @@ def split_mp3(path):
 
         y, sr = librosa.load(temp_path, sr=None, mono=True)
 
-        if is_music(y, sr):
+        with instrument.timer("is_music", chunk=i):
+            music = is_music(y, sr)
+        instrument.count("chunks")
+
+        if music:
             out_name = f"{base}_music_{i:04d}.wav"
             out_path = os.path.join(OUTPUT_DIR, out_name)
             sf.write(out_path, y, sr)
@@ -58,7 +63,17 @@ def split_mp3(path):
             print(f"✗ speech/noise → {base}_{i:04d}")
 
 
-for file in os.listdir(INPUT_DIR):
-    if file.lower().endswith(".mp3"):
-        print(f"\nProcessing {file}")
-        split_mp3(os.path.join(INPUT_DIR, file))
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the music chunks of every mp3 in mp3s/")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.metrics)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    with instrument.profile(args.profile):
+        for file in os.listdir(INPUT_DIR):
+            if file.lower().endswith(".mp3"):
+                print(f"\nProcessing {file}")
+                with instrument.timer("split_mp3", file=file):
+                    split_mp3(os.path.join(INPUT_DIR, file))
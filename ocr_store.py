@@ -0,0 +1,145 @@
+"""
+ocr_store.py
+Columnar, memory-mappable storage of raw PaddleOCR output for a document.
+
+A store is a directory holding flat little-endian arrays:
+
+  polys.f32         every box polygon, shape (n_boxes, 4, 2), float32
+  scores.f32        recognition score per box, float32
+  text.bin          all recognised texts, UTF-8, concatenated
+  text_offsets.i64  n_boxes + 1 offsets into text.bin
+  page_offsets.i64  n_pages + 1 offsets into the box arrays
+  meta.json         page numbers, image sizes, dpi, source and counts
+
+Pages are appended while OCR runs, so nothing but the offsets is kept in
+memory, and readers can memory-map any page without re-running OCR.
+"""
+
+from __future__ import annotations
+import os
+import json
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+
+POLY_POINTS = 4
+
+
+def ocr_fields(ocr_result):
+    """
+    (polys, rec_texts, rec_scores) from a PaddleOCR OCRResult (dict-like).
+    Only rec_polys is guaranteed to line up with the recognised texts (dt_polys
+    holds every detection, including boxes dropped before recognition), so it is
+    preferred; dt_polys is the fallback for older results and stored pages.
+    """
+    texts = list(ocr_result.get("rec_texts", []))
+    polys = ocr_result.get("rec_polys")
+    if polys is None:
+        polys = ocr_result.get("dt_polys", [])
+    scores = ocr_result.get("rec_scores", [1.0] * len(texts))
+    if not (len(polys) == len(texts) == len(scores)):
+        raise ValueError(f"OCR result out of step: {len(polys)} boxes, {len(texts)} texts, {len(scores)} scores")
+    return polys, texts, scores
+
+
+def _as_quad(poly) -> np.ndarray:
+    """Detection polygons are quads; anything else is reduced to its bounding box."""
+    pts = np.asarray(poly, dtype=np.float32).reshape(-1, 2)
+    if len(pts) == POLY_POINTS:
+        return pts
+    (x0, y0), (x1, y1) = pts.min(axis=0), pts.max(axis=0)
+    return np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], dtype=np.float32)
+
+
+class OCRStoreWriter:
+    def __init__(self, path: str, source: Optional[str] = None, dpi: Optional[int] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.meta = {"source": source, "dpi": dpi, "pages": [], "sizes": [], "n_boxes": 0}
+        self._polys = open(os.path.join(path, "polys.f32"), "wb")
+        self._scores = open(os.path.join(path, "scores.f32"), "wb")
+        self._text = open(os.path.join(path, "text.bin"), "wb")
+        self._text_offsets: List[int] = [0]
+        self._page_offsets: List[int] = [0]
+
+    def add_page(self, page: int, ocr_result, size=None):
+        """Append one page. `size` is the (width, height) of the image OCR ran on."""
+        polys, texts, scores = ocr_fields(ocr_result)
+        quads = np.stack([_as_quad(p) for p in polys]) if len(polys) else np.zeros((0, POLY_POINTS, 2), np.float32)
+        self._polys.write(quads.astype("<f4").tobytes())
+        self._scores.write(np.asarray(scores, dtype="<f4").tobytes())
+        for t in texts:
+            data = t.encode("utf-8")
+            self._text.write(data)
+            self._text_offsets.append(self._text_offsets[-1] + len(data))
+        self._page_offsets.append(self._page_offsets[-1] + len(texts))
+        self.meta["pages"].append(page)
+        self.meta["sizes"].append(list(size) if size is not None else None)
+        self.meta["n_boxes"] += len(texts)
+
+    def close(self):
+        for f in (self._polys, self._scores, self._text):
+            f.close()
+        np.asarray(self._text_offsets, dtype="<i8").tofile(os.path.join(self.path, "text_offsets.i64"))
+        np.asarray(self._page_offsets, dtype="<i8").tofile(os.path.join(self.path, "page_offsets.i64"))
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class OCRStore:
+    """Read-only, memory-mapped view of a store written by OCRStoreWriter."""
+
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Not an OCR store (no meta.json): {path}")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        n = self.meta["n_boxes"]
+        self.path = path
+        self.pages: List[int] = self.meta["pages"]
+        self._page_idx: Dict[int, int] = {p: i for i, p in enumerate(self.pages)}
+        self.polys = self._map("polys.f32", "<f4", (n, POLY_POINTS, 2))
+        self.scores = self._map("scores.f32", "<f4", (n,))
+        self.text_offsets = self._map("text_offsets.i64", "<i8", (n + 1,))
+        self.page_offsets = self._map("page_offsets.i64", "<i8", (len(self.pages) + 1,))
+        size = os.path.getsize(os.path.join(path, "text.bin"))
+        self.text_blob = self._map("text.bin", "u1", (size,))
+
+    def _map(self, name: str, dtype: str, shape):
+        if shape[0] == 0:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.path, name), dtype=dtype, mode="r", shape=shape)
+
+    def __len__(self):
+        return len(self.pages)
+
+    def box_range(self, page: int):
+        i = self._page_idx[page]
+        return int(self.page_offsets[i]), int(self.page_offsets[i + 1])
+
+    def texts(self, start: int, end: int) -> List[str]:
+        offs = self.text_offsets[start:end + 1]
+        blob = self.text_blob[offs[0]:offs[-1]].tobytes() if end > start else b""
+        base = int(offs[0])
+        return [blob[int(a) - base:int(b) - base].decode("utf-8") for a, b in zip(offs[:-1], offs[1:])]
+
+    def page(self, page: int) -> Dict:
+        """One page in PaddleOCR's dict layout. Arrays are views into the mapped files."""
+        start, end = self.box_range(page)
+        return {
+            "page": page,
+            "size": self.meta["sizes"][self._page_idx[page]],
+            "dt_polys": self.polys[start:end],
+            "rec_scores": self.scores[start:end],
+            "rec_texts": self.texts(start, end),
+        }
+
+    def iter_pages(self) -> Iterator[Dict]:
+        for p in self.pages:
+            yield self.page(p)
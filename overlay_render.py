@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+overlay_render.py
+Headless bulk rendering of OCR boxes over PDF pages, from a saved OCR store.
+
+Unlike pdf_text_bbox.py this never re-runs OCR and never opens a window. Each
+worker process opens the PDF and the memory-mapped store once, then renders,
+draws (OpenCV) and JPEG-encodes one page at a time, so a whole book can be
+reviewed without holding more than a page per worker in memory.
+
+Usage examples:
+  Whole book:      python overlay_render.py --pdf christianhymnal.pdf --store ocr_store --out overlays
+  QA low scores:   python overlay_render.py --pdf christianhymnal.pdf --store ocr_store --out qa --low-conf 0.6
+  A page range:    python overlay_render.py --pdf christianhymnal.pdf --store ocr_store --out qa --pages 11-40
+"""
+
+from __future__ import annotations
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from lyric_layout import parse_pages
+from ocr_store import OCRStore
+
+# ---- Config ----
+RENDER_DPI = 150  # overlays are for review; boxes are rescaled from the OCR dpi
+JPEG_QUALITY = 80
+GOOD_COLOR = (0, 200, 0)  # BGR
+LOW_COLOR = (0, 0, 255)
+LOW_SCORE = 0.5  # boxes below this are drawn in LOW_COLOR when --low-conf is not given
+
+_worker = {}
+
+
+def _init_worker(pdf_path: str, store_path: str):
+    _worker["pdf"] = fitz.open(pdf_path)
+    _worker["store"] = OCRStore(store_path)
+
+
+def render_page(page: int, out_dir: str, dpi: int, low_conf: Optional[float], labels: bool) -> Optional[str]:
+    """Draw one page's boxes and write its JPEG. Returns the path, or None if skipped."""
+    store: OCRStore = _worker["store"]
+    data = store.page(page)
+    polys, scores, texts = data["dt_polys"], data["rec_scores"], data["rec_texts"]
+    if low_conf is not None:
+        sel = np.flatnonzero(scores < low_conf)
+        if len(sel) == 0:
+            return None
+        polys, scores, texts = polys[sel], scores[sel], [texts[i] for i in sel]
+
+    pdf_page = _worker["pdf"][page - 1]
+    pix = pdf_page.get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+    img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    img = cv2.cvtColor(img, cv2.COLOR_RGB2BGR if pix.n == 3 else cv2.COLOR_RGBA2BGR)
+
+    # Boxes are in the coordinates of the image OCR ran on; rescale to this render.
+    size = data["size"]
+    if size:
+        scale = np.array([pix.width / size[0], pix.height / size[1]], dtype=np.float32)
+    else:
+        scale = np.float32(dpi / (store.meta.get("dpi") or dpi))
+    pts = np.rint(np.asarray(polys) * scale).astype(np.int32)
+
+    threshold = low_conf if low_conf is not None else LOW_SCORE
+    for quad, score, text in zip(pts, scores, texts):
+        color = LOW_COLOR if score < threshold else GOOD_COLOR
+        cv2.polylines(img, [quad], True, color, 1)
+        if labels:
+            # Hershey fonts are ASCII only
+            label = f"{text.encode('ascii', 'replace').decode()} ({score:.2f})" if low_conf is not None else f"{score:.2f}"
+            cv2.putText(img, label, (int(quad[0][0]), int(quad[0][1]) - 3),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.35, color, 1, cv2.LINE_AA)
+
+    out_path = os.path.join(out_dir, f"page_{page:04d}_bbox.jpg")
+    cv2.imwrite(out_path, img, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return out_path
+
+
+def render_overlays(pdf_path: str, store_path: str, out_dir: str, pages=None, dpi: int = RENDER_DPI,
+                    low_conf: Optional[float] = None, labels: bool = True, workers: Optional[int] = None) -> int:
+    os.makedirs(out_dir, exist_ok=True)
+    store = OCRStore(store_path)
+    wanted = [p for p in store.pages if pages is None or p in pages]
+    written = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(pdf_path, store_path)) as pool:
+        futures = [pool.submit(render_page, p, out_dir, dpi, low_conf, labels) for p in wanted]
+        for i, fut in enumerate(futures, start=1):
+            if fut.result():
+                written += 1
+            if i % 50 == 0 or i == len(futures):
+                print(f"{i}/{len(futures)} pages, {written} overlays written")
+    return written
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Headless OCR overlay renderer")
+    parser.add_argument("--pdf", required=True)
+    parser.add_argument("--store", required=True, help="OCR store written with --ocr-store")
+    parser.add_argument("--out", required=True, help="Output directory for JPEGs")
+    parser.add_argument("--pages", help="Page ranges, e.g. 11-40,52")
+    parser.add_argument("--dpi", type=int, default=RENDER_DPI)
+    parser.add_argument("--low-conf", type=float, help="Only draw boxes scoring below this (and only pages that have any)")
+    parser.add_argument("--no-labels", action="store_true")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    written = render_overlays(args.pdf, args.store, args.out, pages=parse_pages(args.pages), dpi=args.dpi,
+                              low_conf=args.low_conf, labels=not args.no_labels, workers=args.workers)
+    print(f"Done. {written} overlay(s) saved to '{args.out}'.")
+
+
+if __name__ == "__main__":
+    main()
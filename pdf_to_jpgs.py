@@ -1,6 +1,111 @@
-from pdf2image import convert_from_path
+"""
+Export every hymnal page as song-scroller images at several sizes.
 
-images = convert_from_path("pdfs/christianhymnal-1.pdf")
+Each page is rendered once with PyMuPDF and saved as thumbnail, screen and full
+variants (progressive JPEG, or WebP). Pages are spread over a process pool and
+streamed, so only one page per worker is ever in memory. Pages whose outputs
+are newer than the PDF are skipped. manifest.json lists every page's files,
+byte sizes and dimensions so the front end can lazy-load them.
 
-for i in range(len(images)):
-    images[i].save(f"songscroller/img/songscroller{i}","JPEG")
\ No newline at end of file
+Usage: python pdf_to_jpgs.py [--pdf pdfs/christianhymnal-1.pdf] [--out songscroller/img] [--format webp]
+"""
+
+import io
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+from PIL import Image
+
+PDF_PATH = "pdfs/christianhymnal-1.pdf"
+OUT_DIR = "songscroller/img"
+FULL_DPI = 200
+# variant -> target width in pixels (None = full render)
+VARIANTS = {"thumb": 240, "screen": 1080, "full": None}
+QUALITY = {"thumb": 70, "screen": 82, "full": 88}
+
+_pdf = None
+
+
+def _init_worker(pdf_path):
+    global _pdf
+    _pdf = fitz.open(pdf_path)
+
+
+def variant_paths(out_dir, i, fmt):
+    ext = "webp" if fmt == "webp" else "jpg"
+    return {v: os.path.join(out_dir, f"songscroller{i}-{v}.{ext}") for v in VARIANTS}
+
+
+def describe(path):
+    """Manifest entry for an existing image (PIL only reads the header)."""
+    with Image.open(path) as img:
+        width, height = img.size
+    return {"file": os.path.basename(path), "bytes": os.path.getsize(path), "width": width, "height": height}
+
+
+def export_page(i, out_dir, fmt, pdf_mtime, force=False):
+    """Render page i once and write every variant. Returns (i, manifest entry, rendered?)."""
+    paths = variant_paths(out_dir, i, fmt)
+    if not force and all(os.path.exists(p) and os.path.getmtime(p) > pdf_mtime for p in paths.values()):
+        return i, {v: describe(p) for v, p in paths.items()}, False
+
+    page = _pdf[i]
+    pix = page.get_pixmap(matrix=fitz.Matrix(FULL_DPI / 72, FULL_DPI / 72), alpha=False)
+    full = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+    entry = {}
+    for variant, width in VARIANTS.items():
+        img = full
+        if width and full.width > width:
+            img = full.resize((width, round(full.height * width / full.width)), Image.LANCZOS)
+        buf = io.BytesIO()
+        if fmt == "webp":
+            img.save(buf, "WEBP", quality=QUALITY[variant], method=4)
+        else:
+            img.save(buf, "JPEG", quality=QUALITY[variant], optimize=True, progressive=True)
+        tmp = paths[variant] + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(tmp, paths[variant])
+        entry[variant] = {"file": os.path.basename(paths[variant]), "bytes": buf.tell(),
+                          "width": img.width, "height": img.height}
+    return i, entry, True
+
+
+def export_pdf(pdf_path=PDF_PATH, out_dir=OUT_DIR, fmt="jpeg", workers=None, force=False):
+    os.makedirs(out_dir, exist_ok=True)
+    pdf_mtime = os.path.getmtime(pdf_path)
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+    pages = [None] * page_count
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pdf_path,)) as pool:
+        futures = [pool.submit(export_page, i, out_dir, fmt, pdf_mtime, force) for i in range(page_count)]
+        for n, fut in enumerate(futures, start=1):
+            i, entry, did_render = fut.result()
+            pages[i] = {"page": i, "variants": entry}
+            rendered += did_render
+            if n % 50 == 0 or n == page_count:
+                print(f"{n}/{page_count} pages ({rendered} rendered, {n - rendered} up to date)")
+
+    manifest = {"source": os.path.basename(pdf_path), "format": fmt, "dpi": FULL_DPI, "pages": pages}
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return rendered, page_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export song-scroller page images")
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--out", default=OUT_DIR)
+    parser.add_argument("--format", choices=["jpeg", "webp"], default="jpeg")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-render pages even if outputs are up to date")
+    args = parser.parse_args()
+
+    rendered, total = export_pdf(args.pdf, args.out, args.format, args.workers, args.force)
+    print(f"Rendered {rendered} of {total} pages into {args.out} (manifest.json written)")
@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+"""
+pipeline.py
+Incremental orchestrator for the hymnal workflow.
+
+The hand-run chain (OCR -> texts -> catalog/segmentation -> fields -> hymnal_songs.json
+-> embedding index) is declared here as a DAG of stages. Every artifact lives in
+.pipeline/artifacts/<stage>/<key>/, where the key hashes the stage's code, its
+parameters and its inputs, so a run only recomputes what is stale. Per-page
+(OCR, layout) and per-song (field extraction) stages are keyed item by item,
+so editing one page or one song chunk only redoes that item. Independent
+stages run in parallel.
+
+Usage examples:
+  What would run:  python pipeline.py run --dry-run
+  Build songs:     python pipeline.py run --targets songs_json --jobs 4
+  Publish:         python pipeline.py run --publish   (copies outputs to texts/, hymnal_songs.json, ...)
+"""
+
+from __future__ import annotations
+import os
+import io
+import sys
+import json
+import shutil
+import hashlib
+import inspect
+import argparse
+import threading
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+import instrument
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ---- Config ----
+WORK_DIR = ".pipeline"
+PDF_PATH = "christianhymnal.pdf"
+OCR_DPI = 350
+LLM_MODEL = "phi3:mini"
+PROMPT_PATH = "prompts/improved_prompt.md"
+
+
+def load_script(filename: str):
+    """Import a pipeline script by path (several have hyphens in their names)."""
+    name = os.path.splitext(filename)[0].replace("-", "_")
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def sha(*parts) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p if isinstance(p, bytes) else json.dumps(p, sort_keys=True, default=str).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ---- Stage declarations ----
+class Stage:
+    """
+    A node of the DAG. `run(ctx, deps, out_dir)` builds the whole artifact; a map
+    stage instead gives `items(ctx, deps) -> {item_id: fingerprint}` and
+    `run_item(ctx, deps, item_id, out_dir)`, and each item is cached on its own.
+    `items_from` names the dependency the items come from (default: the first);
+    any other dependency is part of every item's key.
+    `deps` maps dependency names to their artifact directories. `publish_check(src,
+    dest)` may veto copying an output over an existing file by returning a reason.
+    """
+
+    def __init__(self, name: str, deps=(), files: Callable = None, params: Callable = None,
+                 code=(), run: Callable = None, items: Callable = None, run_item: Callable = None,
+                 items_from: Optional[str] = None, workers: int = 1, publish: Dict[str, str] = None,
+                 publish_check: Callable = None):
+        self.name = name
+        self.deps = list(deps)
+        self.files = files or (lambda ctx: [])
+        self.params = params or (lambda ctx: {})
+        self.run = run
+        self.items = items
+        self.run_item = run_item
+        self.items_from = items_from or (self.deps[0] if self.deps else None)
+        self.workers = workers
+        self.publish = publish or {}
+        self.publish_check = publish_check
+        sources = [_source(f) for f in (run, items, run_item) if f is not None]
+        self.code_hash = sha(sources, [file_hash(os.path.join(HERE, c)) for c in code])
+
+    @property
+    def is_map(self) -> bool:
+        return self.run_item is not None
+
+
+def _source(fn) -> str:
+    try:
+        return inspect.getsource(fn)
+    except OSError:  # defined interactively; fall back to the bytecode
+        return fn.__code__.co_code.hex() + repr(fn.__code__.co_consts)
+
+
+def write_json(path: str, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def _read_index(path: str) -> Dict[str, Dict]:
+    with open(os.path.join(path, "index.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -- OCR, one artifact per page --
+def pdf_page_items(ctx, deps):
+    """Fingerprint each page by its content stream and embedded images."""
+    import fitz
+    items = {}
+    with fitz.open(ctx["pdf"]) as doc:
+        for i, page in enumerate(doc):
+            parts = [page.read_contents()] + [doc.xref_stream_raw(img[0]) or b"" for img in page.get_images()]
+            items[str(i + 1)] = sha(*parts)
+    return items
+
+
+def ocr_page(ctx, deps, item_id, out_dir):
+    import fitz
+    from PIL import Image
+    ocr_v2 = load_script("hymnal-ocr-v2.py")
+    with ctx["lock"]:
+        if "ocr_engine" not in ctx:
+            ctx["ocr_engine"] = ocr_v2.init_ocr()
+    page_no = int(item_id)
+    with fitz.open(ctx["pdf"]) as doc:
+        pix = doc[page_no - 1].get_pixmap(matrix=fitz.Matrix(OCR_DPI / 72, OCR_DPI / 72))
+    img = Image.open(io.BytesIO(pix.tobytes("png"))).convert("RGB")
+    from ocr_store import ocr_fields
+    with instrument.timer("ocr", page=page_no):
+        result = ctx["ocr_engine"].predict(ocr_v2.preprocess(img))[0]
+    polys, texts, scores = ocr_fields(result)
+    page = {
+        "page": page_no,
+        "size": list(img.size),
+        "dt_polys": [[[float(x), float(y)] for x, y in poly] for poly in polys],
+        "rec_texts": texts,
+        "rec_scores": [float(s) for s in scores],
+    }
+    with open(os.path.join(out_dir, "page.json"), "w", encoding="utf-8") as f:
+        json.dump(page, f, ensure_ascii=False)
+
+
+def _ocr_pages(deps) -> List[Dict]:
+    pages = []
+    index = _read_index(deps["ocr_pages"])
+    for item_id in sorted(index, key=int):
+        with open(os.path.join(index[item_id]["path"], "page.json"), "r", encoding="utf-8") as f:
+            pages.append(json.load(f))
+    return pages
+
+
+def build_ocr_store(ctx, deps, out_dir):
+    from ocr_store import OCRStoreWriter
+    with OCRStoreWriter(os.path.join(out_dir, "store"), source=ctx["pdf"], dpi=OCR_DPI) as store:
+        for page in _ocr_pages(deps):
+            store.add_page(page["page"], page, size=page["size"])
+
+
+def build_ocr_text(ctx, deps, out_dir):
+    text = "\n".join(t for page in _ocr_pages(deps) for t in page["rec_texts"])
+    with open(os.path.join(out_dir, "text.txt"), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+# -- Layout, one artifact per page, keyed by that page's OCR artifact --
+def upstream_items(dep):
+    def items(ctx, deps):
+        return {item_id: entry["key"] for item_id, entry in _read_index(deps[dep]).items()}
+    return items
+
+
+def layout_page(ctx, deps, item_id, out_dir):
+    from lyric_layout import reconstruct_page, verses_text
+    entry = _read_index(deps["ocr_pages"])[item_id]
+    with open(os.path.join(entry["path"], "page.json"), "r", encoding="utf-8") as f:
+        page = json.load(f)
+    lines = reconstruct_page(page["dt_polys"], page["rec_texts"], page["rec_scores"])
+    with open(os.path.join(out_dir, "lines.json"), "w", encoding="utf-8") as f:
+        json.dump({"page": page["page"], "lines": lines, "verses": verses_text(lines)}, f, ensure_ascii=False)
+
+
+# -- Catalog and segmentation --
+def build_catalog_stage(ctx, deps, out_dir):
+    from hymn_catalog import build_catalog
+    build_catalog(os.path.join(out_dir, "catalog.sqlite"), ctx["general_index"], ctx["topical_index"], songs_path="")
+
+
+def segment_songs(ctx, deps, out_dir):
+    """
+    Split the OCR text at title lines confirmed by their song number. The running
+    category header each song falls under is worked out here, in book order, so
+    per-song extraction can stay independent.
+    """
+    from field_extractor import FieldExtractor
+    from hymn_catalog import HymnCatalog
+    from title_matcher import TitleMatcher, split_songs
+    catalog = HymnCatalog(os.path.join(deps["catalog"], "catalog.sqlite"))
+    with open(os.path.join(deps["ocr_text"], "text.txt"), "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    chunks = split_songs(TitleMatcher(catalog.titles()), lines)
+    categories = FieldExtractor(catalog).running_categories([chunk_lines for _, _, chunk_lines in chunks])
+    os.makedirs(os.path.join(out_dir, "songs"))
+    segments, by_number = {}, {}
+    for (number, _, chunk_lines), category in zip(chunks, categories):
+        chunk = "\n".join(chunk_lines)
+        with open(os.path.join(out_dir, "songs", f"{number}.txt"), "w", encoding="utf-8") as f:
+            f.write(chunk)
+        segments[str(number)] = sha(chunk, category)
+        by_number[str(number)] = category
+    unsegmented = sorted(set(catalog.songs) - {number for number, _, _ in chunks})
+    write_json(os.path.join(out_dir, "segments.json"), segments)
+    write_json(os.path.join(out_dir, "categories.json"), by_number)
+    write_json(os.path.join(out_dir, "unsegmented.json"), unsegmented)
+    instrument.count("songs_unsegmented", len(unsegmented))
+    if unsegmented:
+        print(f"  segments: {len(unsegmented)} of {len(catalog.songs)} catalog songs not found in the OCR text "
+              f"(see unsegmented.json)")
+
+
+def segment_items(ctx, deps):
+    with open(os.path.join(deps["segments"], "segments.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -- Field extraction, one artifact per song chunk; the LLM only sees what the rules miss --
+def extract_song(ctx, deps, item_id, out_dir):
+    from field_extractor import FieldExtractor, estimate_tokens, field_specs, fill_gaps, gap_prompt, parse_response
+    from hymn_catalog import HymnCatalog
+    with ctx["lock"]:
+        if "extractor" not in ctx:
+            ctx["extractor"] = FieldExtractor(HymnCatalog(os.path.join(deps["catalog"], "catalog.sqlite")))
+            ctx["field_specs"] = field_specs(ctx["prompt"])
+            with open(ctx["prompt"], "r", encoding="utf-8") as f:
+                ctx["prompt_tokens"] = estimate_tokens(f.read())
+    with open(os.path.join(deps["segments"], "songs", f"{item_id}.txt"), "r", encoding="utf-8") as f:
+        chunk = f.read()
+    with open(os.path.join(deps["segments"], "categories.json"), "r", encoding="utf-8") as f:
+        category = json.load(f).get(item_id)
+    with instrument.timer("extract_fields", song=item_id):
+        result = ctx["extractor"].extract(chunk.split("\n"), int(item_id), category)
+
+    baseline = ctx["prompt_tokens"] + estimate_tokens(chunk)
+    if result["gaps"]:
+        ollama_please = load_script("ollama-please.py")
+
+        def ask(prompt):
+            # ask_ollama returns failures as text; raise so they are not cached as answers
+            reply = ollama_please.ask_ollama(prompt, model=ctx["llm_model"])
+            if reply.startswith("Error:") or not parse_response(reply):
+                raise RuntimeError(f"song {item_id}: no usable LLM reply: {reply[:200]!r}")
+            return reply
+
+        with instrument.timer("llm", song=item_id, gaps=len(result["gaps"])):
+            song = fill_gaps(result, chunk, ask, ctx["field_specs"])
+        instrument.count("llm_calls")
+        instrument.count("prompt_tokens_saved", baseline - estimate_tokens(gap_prompt(result, chunk, ctx["field_specs"])))
+    else:
+        song = result["fields"]
+        instrument.count("llm_calls_saved")
+        instrument.count("prompt_tokens_saved", baseline)
+    with open(os.path.join(out_dir, "song.json"), "w", encoding="utf-8") as f:
+        json.dump(song, f, ensure_ascii=False, indent=2)
+
+
+def collect_songs(ctx, deps, out_dir):
+    from hymn_corpus import HymnRecord, read_jsonl, to_json, write_jsonl
+    index = _read_index(deps["llm_songs"])
+
+    def records():
+        for item_id in sorted(index, key=int):
+            with open(os.path.join(index[item_id]["path"], "song.json"), "r", encoding="utf-8") as f:
+                yield HymnRecord.from_dict(json.load(f))
+
+    jsonl = os.path.join(out_dir, "hymnal_songs.jsonl")
+    write_jsonl(jsonl, records())
+    to_json(read_jsonl(jsonl), os.path.join(out_dir, "hymnal_songs.json"))
+
+
+def _count_songs(path: str) -> int:
+    if path.endswith(".jsonl"):
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+    with open(path, "r", encoding="utf-8") as f:
+        return len(json.load(f))
+
+
+def fewer_songs(src: str, dest: str) -> Optional[str]:
+    """Segmentation misses songs, so don't let a partial run replace a fuller songs file."""
+    new, old = _count_songs(src), _count_songs(dest)
+    return f"{new} songs would replace {old}" if new < old else None
+
+
+def build_embeddings(ctx, deps, out_dir):
+    from embed_search import EmbeddingIndex
+    from hymn_corpus import read_jsonl
+    docs = [(f"song:{s.song_number}", f"{s.song_title or ''}\n{s.song_lyrics or ''}")
+            for s in read_jsonl(os.path.join(deps["songs_json"], "hymnal_songs.jsonl"))]
+    ei = EmbeddingIndex()
+    ei.build_from_documents(docs)
+    ei.save(os.path.join(out_dir, "index.faiss"), os.path.join(out_dir, "meta.json"))
+
+
+# Repo modules each stage's functions use, directly or through the modules they import
+# (timing-only instrument.py aside); editing any of them must invalidate the stage.
+SEGMENT_CODE = ["title_matcher.py", "field_extractor.py", "hymn_catalog.py", "hymn_corpus.py",
+                "lyric_layout.py", "ocr_store.py"]
+
+
+def default_stages() -> List[Stage]:
+    return [
+        Stage("ocr_pages", params=lambda ctx: {"dpi": OCR_DPI}, code=["hymnal-ocr-v2.py", "ocr_store.py"],
+              items=pdf_page_items, run_item=ocr_page),
+        Stage("ocr_store", deps=["ocr_pages"], code=["ocr_store.py"], run=build_ocr_store),
+        Stage("ocr_text", deps=["ocr_pages"], run=build_ocr_text,
+              publish={"text.txt": "texts/hymnal-text-v2.txt"}),
+        Stage("lyric_lines", deps=["ocr_pages"], code=["lyric_layout.py", "ocr_store.py"],
+              items=upstream_items("ocr_pages"), run_item=layout_page, workers=4),
+        # Not published: it is built without songs JSON pages (songs_json depends on
+        # it), so it would replace hymn_catalog.sqlite with a page-less catalog.
+        Stage("catalog", files=lambda ctx: [ctx["general_index"], ctx["topical_index"]],
+              code=["hymn_catalog.py"], run=build_catalog_stage),
+        Stage("segments", deps=["ocr_text", "catalog"], code=SEGMENT_CODE, run=segment_songs),
+        Stage("llm_songs", deps=["segments", "catalog"], files=lambda ctx: [ctx["prompt"]],
+              params=lambda ctx: {"model": ctx["llm_model"]}, code=SEGMENT_CODE + ["ollama-please.py"],
+              items=segment_items, items_from="segments", run_item=extract_song, workers=2),
+        Stage("songs_json", deps=["llm_songs"], code=["hymn_corpus.py"], run=collect_songs,
+              publish={"hymnal_songs.json": "hymnal_songs.json", "hymnal_songs.jsonl": "hymnal_songs.jsonl"},
+              publish_check=fewer_songs),
+        Stage("embed_index", deps=["songs_json"], code=["embed_search.py", "hymn_corpus.py"], run=build_embeddings,
+              publish={"index.faiss": "index.faiss", "meta.json": "meta.json"}),
+    ]
+
+
+# ---- Execution ----
+class Pipeline:
+    def __init__(self, stages: List[Stage], ctx: Dict, work_dir: str = WORK_DIR):
+        self.stages = {s.name: s for s in stages}
+        self.ctx = ctx
+        self.ctx.setdefault("lock", threading.Lock())
+        self.artifacts = os.path.join(work_dir, "artifacts")
+        self.keys: Dict[str, str] = {}  # stage -> artifact key, once known
+
+    def closure(self, targets: Optional[List[str]]) -> List[str]:
+        """Topologically ordered stages needed for `targets` (all stages if None)."""
+        order: List[str] = []
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"Cycle in pipeline: {' -> '.join(path + (name,))}")
+            if name in order:
+                return
+            for d in self.stages[name].deps:
+                visit(d, path + (name,))
+            order.append(name)
+
+        for t in targets or list(self.stages):
+            if t not in self.stages:
+                raise KeyError(f"Unknown stage: {t}")
+            visit(t)
+        return order
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.artifacts, stage, key)
+
+    def _base(self, stage: Stage) -> List:
+        return [stage.name, stage.code_hash, stage.params(self.ctx),
+                [file_hash(p) for p in stage.files(self.ctx)]]
+
+    def stage_key(self, stage: Stage) -> Optional[str]:
+        """Key of a whole stage, or None while a dependency's key is unknown."""
+        if any(d not in self.keys for d in stage.deps):
+            return None
+        return sha(self._base(stage), [self.keys[d] for d in stage.deps])
+
+    def item_keys(self, stage: Stage, deps: Dict[str, str]) -> Dict[str, str]:
+        # Items are keyed by their own fingerprint, not the whole key of the
+        # dependency they come from, so one changed page does not invalidate every
+        # other page. Every other dependency (e.g. the catalog) applies to all items.
+        # The item id is part of the key too: artifacts record it (page.json's "page"),
+        # so two identical pages must not share one.
+        base = [self._base(stage), [self.keys[d] for d in stage.deps if d != stage.items_from]]
+        return {item_id: sha(base, item_id, fp) for item_id, fp in stage.items(self.ctx, deps).items()}
+
+    def _deps(self, stage: Stage) -> Dict[str, str]:
+        return {d: self._path(d, self.keys[d]) for d in stage.deps}
+
+    def _build(self, stage: str, key: str, fn) -> bool:
+        """Run fn(out_dir) into a temp dir and move it into place. False if cached."""
+        final = self._path(stage, key)
+        if os.path.isdir(final):
+            return False
+        tmp = f"{final}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        try:
+            fn(tmp)
+            os.replace(tmp, final)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if os.path.isdir(final):  # another thread built the same key first
+                return False
+            raise
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return True
+
+    def run_stage(self, name: str) -> str:
+        stage = self.stages[name]
+        deps = self._deps(stage)
+        if not stage.is_map:
+            key = self.stage_key(stage)
+            with instrument.timer("stage", stage=name):
+                built = self._build(name, key, lambda out: stage.run(self.ctx, deps, out))
+            self.keys[name] = key
+            return f"{name}: {'built' if built else 'cached'}"
+
+        keys = self.item_keys(stage, deps)
+        todo = [i for i, k in keys.items() if not os.path.isdir(self._path(name, k))]
+        with instrument.timer("stage", stage=name, items=len(keys), stale=len(todo)):
+            with ThreadPoolExecutor(max_workers=stage.workers) as pool:
+                futures = [pool.submit(self._build, name, keys[i],
+                                       lambda out, i=i: stage.run_item(self.ctx, deps, i, out)) for i in todo]
+                for f in futures:
+                    f.result()
+        index = {i: {"key": k, "path": os.path.abspath(self._path(name, k))} for i, k in keys.items()}
+        key = sha(name, sorted(keys.items()))
+        self._build(name, key, lambda out: write_json(os.path.join(out, "index.json"), index))
+        self.keys[name] = key
+        return f"{name}: {len(todo)}/{len(keys)} items built"
+
+    def run(self, targets: Optional[List[str]] = None, jobs: int = 2) -> List[str]:
+        """Run stale stages, starting each as soon as its dependencies are done."""
+        order = self.closure(targets)
+        done: set = set()
+        running = {}
+        log = []
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            while len(done) < len(order):
+                for name in order:
+                    if name not in done and name not in running and all(d in done for d in self.stages[name].deps):
+                        running[name] = pool.submit(self.run_stage, name)
+                finished, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+                for name, fut in list(running.items()):
+                    if fut in finished:
+                        msg = fut.result()
+                        print(msg)
+                        log.append(msg)
+                        done.add(name)
+                        del running[name]
+        return log
+
+    def plan(self, targets: Optional[List[str]] = None) -> List[str]:
+        """Dry run: what would execute, without running anything."""
+        lines = []
+        for name in self.closure(targets):
+            stage = self.stages[name]
+            if any(d not in self.keys for d in stage.deps):
+                lines.append(f"{name:12s} would run (after {', '.join(d for d in stage.deps if d not in self.keys)})")
+                continue
+            if not stage.is_map:
+                key = self.stage_key(stage)
+                cached = os.path.isdir(self._path(name, key))
+                if cached:
+                    self.keys[name] = key
+                lines.append(f"{name:12s} {'cached' if cached else 'would run'}  {key[:12]}")
+                continue
+            keys = self.item_keys(stage, self._deps(stage))
+            stale = [i for i, k in keys.items() if not os.path.isdir(self._path(name, k))]
+            key = sha(name, sorted(keys.items()))
+            if not stale and os.path.isdir(self._path(name, key)):
+                self.keys[name] = key
+            lines.append(f"{name:12s} {len(stale)}/{len(keys)} items would run"
+                         + (f" ({', '.join(stale[:8])}{', …' if len(stale) > 8 else ''})" if stale else ""))
+        return lines
+
+    def publish(self, targets: Optional[List[str]] = None, force: bool = False):
+        """Copy published outputs of built stages to their usual places in the repo."""
+        for name in self.closure(targets):
+            stage = self.stages[name]
+            for src, dest in stage.publish.items():
+                if name in self.keys:
+                    src_path = os.path.join(self._path(name, self.keys[name]), src)
+                    veto = stage.publish_check(src_path, dest) if stage.publish_check and os.path.exists(dest) else None
+                    if veto and not force:
+                        print(f"  {name}/{src} not published: {veto} (--force-publish to overwrite)")
+                        continue
+                    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+                    shutil.copyfile(src_path, dest)
+                    if dest.endswith(".jsonl"):
+                        from hymn_corpus import remove_index
+                        remove_index(dest)  # offsets of the file we just replaced
+                    print(f"  {name}/{src} → {dest}")
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Incremental hymnal pipeline")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", help="Run (or with --dry-run, show) stale stages")
+    p_run.add_argument("--targets", nargs="+", help="Stages to bring up to date (default: all)")
+    p_run.add_argument("--dry-run", action="store_true")
+    p_run.add_argument("--jobs", type=int, default=2, help="Stages run concurrently")
+    p_run.add_argument("--publish", action="store_true", help="Copy outputs into texts/, hymnal_songs.json, ...")
+    p_run.add_argument("--force-publish", action="store_true", help="Publish even over a file with more songs")
+    p_run.add_argument("--pdf", default=PDF_PATH)
+    p_run.add_argument("--work-dir", default=WORK_DIR)
+    p_run.add_argument("--llm-model", default=LLM_MODEL)
+    sub.add_parser("stages", help="List stages and their dependencies")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.metrics)
+
+    if args.cmd == "stages":
+        for s in default_stages():
+            kind = "per item" if s.is_map else "whole"
+            print(f"{s.name:12s} {kind:9s} <- {', '.join(s.deps) or '(sources)'}")
+        return
+
+    ctx = {
+        "pdf": args.pdf,
+        "general_index": "texts/general-index.txt",
+        "topical_index": "texts/topical-index.txt",
+        "prompt": PROMPT_PATH,
+        "llm_model": args.llm_model,
+    }
+    pipeline = Pipeline(default_stages(), ctx, args.work_dir)
+    if args.dry_run:
+        for line in pipeline.plan(args.targets):
+            print(line)
+        return
+    with instrument.profile(args.profile):
+        pipeline.run(args.targets, jobs=args.jobs)
+    if args.publish:
+        print("Publishing:")
+        pipeline.publish(args.targets, force=args.force_publish)
+
+
+if __name__ == "__main__":
+    main()
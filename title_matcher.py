@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+title_matcher.py
+Approximate matching of OCR'd lines against the hymnal's index titles.
+
+OCR mangles headings ("Refkaik", "namel", "sou!"), so exact lookups fail.
+Candidates are generated from a character-trigram inverted index over the
+normalized titles and then verified with a banded edit distance, which is cut
+off as soon as it exceeds the allowed error budget.
+
+Usage examples:
+  One line:  python title_matcher.py match "Corne, Thou A1mighty Kinq"
+  Bulk tag:  python title_matcher.py scan --source texts/full_body.txt --out title_lines.jsonl
+"""
+
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import argparse
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+
+from hymn_catalog import CATALOG_PATH, GENERAL_INDEX, HymnCatalog, normalize_title, parse_index
+
+# ---- Config ----
+MAX_ERROR_RATE = 0.25  # edits allowed per character of the title
+MAX_CANDIDATES = 20  # titles verified per query, best trigram overlap first
+MIN_LENGTH = 4  # shorter lines are never titles
+
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def banded_distance(a: str, b: str, k: int) -> int:
+    """
+    Levenshtein distance between a and b if it is <= k, otherwise k + 1.
+    Only cells within k of the diagonal are computed, so cost is O(k * len).
+    """
+    if abs(len(a) - len(b)) > k:
+        return k + 1
+    if len(a) > len(b):
+        a, b = b, a
+    n, m = len(a), len(b)
+    big = k + 1
+    prev = [j if j <= k else big for j in range(m + 1)]
+    for i in range(1, n + 1):
+        lo, hi = max(1, i - k), min(m, i + k)
+        cur = [big] * (m + 1)
+        if i <= k:
+            cur[0] = i
+        ca = a[i - 1]
+        row_min = cur[0]
+        for j in range(lo, hi + 1):
+            cost = prev[j - 1] + (ca != b[j - 1])
+            if prev[j] + 1 < cost:
+                cost = prev[j] + 1
+            if cur[j - 1] + 1 < cost:
+                cost = cur[j - 1] + 1
+            cur[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > k:
+            return big
+        prev = cur
+    return min(prev[m], big)
+
+
+class TitleMatcher:
+    def __init__(self, titles: List[Tuple[str, int]], max_error_rate: float = MAX_ERROR_RATE):
+        self.max_error_rate = max_error_rate
+        self.entries: List[Tuple[str, str, int]] = []  # (normalized, title, number)
+        seen = set()
+        for title, number in titles:
+            norm = normalize_title(title)
+            if norm and (norm, number) not in seen:
+                seen.add((norm, number))
+                self.entries.append((norm, title, number))
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        self.lengths: List[int] = []
+        self.budgets: List[int] = []  # allowed edits per title
+        self.gram_counts: List[int] = []
+        for eid, (norm, _, _) in enumerate(self.entries):
+            grams = set(trigrams(norm))
+            self.lengths.append(len(norm))
+            self.budgets.append(int(len(norm) * max_error_rate))
+            self.gram_counts.append(len(grams))
+            for g in grams:
+                self.postings[g].append(eid)
+        self.exact = {norm: eid for eid, (norm, _, _) in enumerate(self.entries)}
+
+    @classmethod
+    def from_default_sources(cls, catalog_path: str = CATALOG_PATH, index_path: str = GENERAL_INDEX) -> "TitleMatcher":
+        """Use the compiled catalog when present, otherwise parse the general index."""
+        if os.path.exists(catalog_path):
+            return cls(HymnCatalog(catalog_path).titles())
+        entries, _ = parse_index(index_path)
+        return cls([(title, number) for _, title, number in entries])
+
+    def match(self, line: str) -> Optional[Dict]:
+        """Best {"number", "title", "distance"} for an OCR line, or None."""
+        query = normalize_title(line)
+        if len(query) < MIN_LENGTH:
+            return None
+        eid = self.exact.get(query)
+        if eid is not None:
+            _, title, number = self.entries[eid]
+            return {"number": number, "title": title, "distance": 0}
+
+        grams = set(trigrams(query))
+        counts = Counter(chain.from_iterable(self.postings[g] for g in grams if g in self.postings))
+        # Length and count filters: a title within k edits differs in length by at
+        # most k, and (one edit destroying at most three trigrams) shares at least
+        # max(|T(q)|, |T(t)|) - 3k trigrams with the query.
+        n, nq = len(query), len(grams)
+        lengths, budgets, gram_counts = self.lengths, self.budgets, self.gram_counts
+        survivors = []
+        for eid, shared in counts.items():
+            k = budgets[eid]
+            if abs(lengths[eid] - n) <= k and shared >= (nq if nq > gram_counts[eid] else gram_counts[eid]) - 3 * k:
+                survivors.append(eid)
+        if not survivors:
+            return None
+        candidates = sorted(survivors, key=counts.__getitem__, reverse=True)[:MAX_CANDIDATES]
+
+        best = None
+        best_k = int(len(query) * self.max_error_rate)
+        for eid in candidates:
+            norm, title, number = self.entries[eid]
+            k = min(best_k, self.budgets[eid])
+            d = banded_distance(query, norm, k)
+            if d <= k and (best is None or d < best["distance"]):
+                best = {"number": number, "title": title, "distance": d}
+                best_k = d
+                if d == 0:
+                    break
+        return best
+
+
+def scan_lines(matcher: TitleMatcher, lines: List[str]) -> List[Dict]:
+    """
+    Tag every line that matches an index title. The large song number sits a line
+    or two above the title (OCR order) or a line or two below it, so finding it there is
+    used as confirmation; `start_line_no` is the first line of the song heading
+    (the number's line when it is above the title).
+    """
+    tagged = []
+    for i, line in enumerate(lines):
+        m = matcher.match(line)
+        if m is None:
+            continue
+        number = str(m["number"])
+        above = [j for j in (i - 1, i - 2) if j >= 0 and lines[j].strip() == number]
+        m.update({
+            "line_no": i + 1,
+            "start_line_no": above[0] + 1 if above else i + 1,
+            "line": line.strip(),
+            "number_confirmed": bool(above) or number in [l.strip() for l in lines[i + 1:i + 3]],
+        })
+        tagged.append(m)
+    return tagged
+
+
+def coverage(matcher: TitleMatcher, tagged: List[Dict]) -> Dict:
+    """How many of the catalog's songs were found, and how many of those confirmed."""
+    numbers = {number for _, _, number in matcher.entries}
+    found = {t["number"] for t in tagged}
+    confirmed = {t["number"] for t in tagged if t["number_confirmed"]}
+    return {"songs": len(numbers), "found": len(found & numbers), "confirmed": len(confirmed & numbers),
+            "missing": sorted(numbers - confirmed)}
+
+
+def split_songs(matcher: TitleMatcher, lines: List[str]) -> List[Tuple[int, int, List[str]]]:
+    """
+    Cut OCR text into per-song chunks at title lines confirmed by their song number.
+    Returns [(number, first line_no, chunk lines)]; each number is used once.
+    """
+    starts, seen = [], set()
+    for t in scan_lines(matcher, lines):
+        if t["number_confirmed"] and t["number"] not in seen:
+            seen.add(t["number"])
+            starts.append(t)
+    chunks = []
+    for i, t in enumerate(starts):
+        # chunks start at the title; a song number printed above it is cut from the previous chunk
+        end = starts[i + 1]["start_line_no"] - 1 if i + 1 < len(starts) else len(lines)
+        chunks.append((t["number"], t["line_no"], lines[t["line_no"] - 1:end]))
+    return chunks
+
+
+# ---- CLI ----
+def main():
+    parser = argparse.ArgumentParser(description="Fuzzy matching of OCR lines to index titles")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_match = sub.add_parser("match", help="Match one line")
+    p_match.add_argument("line")
+
+    p_scan = sub.add_parser("scan", help="Tag likely title lines in an OCR text file")
+    p_scan.add_argument("--source", default="texts/full_body.txt")
+    p_scan.add_argument("--out", help="Write tagged lines as JSONL (default: stdout)")
+
+    for p in (p_match, p_scan):
+        p.add_argument("--catalog", default=CATALOG_PATH)
+        p.add_argument("--index", default=GENERAL_INDEX)
+
+    args = parser.parse_args()
+    matcher = TitleMatcher.from_default_sources(args.catalog, args.index)
+
+    if args.cmd == "match":
+        result = matcher.match(args.line)
+        print(json.dumps(result, ensure_ascii=False) if result else "No match.")
+
+    elif args.cmd == "scan":
+        with open(args.source, "r", encoding="utf-8") as f:
+            lines = f.read().split("\n")
+        start = time.perf_counter()
+        tagged = scan_lines(matcher, lines)
+        elapsed = time.perf_counter() - start
+        out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+        for t in tagged:
+            out.write(json.dumps(t, ensure_ascii=False) + "\n")
+        if args.out:
+            out.close()
+        confirmed = sum(t["number_confirmed"] for t in tagged)
+        cov = coverage(matcher, tagged)
+        print(f"{len(tagged)} title lines ({confirmed} confirmed by song number) in {len(lines)} lines, "
+              f"{elapsed * 1e6 / max(len(lines), 1):.1f} µs/line", file=sys.stderr)
+        print(f"Catalog coverage: {cov['confirmed']}/{cov['songs']} songs confirmed, {cov['found']} matched at all",
+              file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
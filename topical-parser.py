@@ -1,4 +1,4 @@
-topical_index = open("topical-index.txt", "r").read()
+topical_index = open("texts/topical-index.txt", "r").read()
 new_file = open("texts/topical-index-new.txt", "w")
 import re
 
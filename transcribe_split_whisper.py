@@ -1,15 +1,20 @@
 import subprocess
-import sys
+import argparse
 import pathlib
 import whisper
 import tempfile
+import time
 import re
+import json
+import instrument
+from transcript_cache import TranscriptCache, audio_key
 
 # ---------------- CONFIG ----------------
 SILENCE_DB = -40        # silence threshold (dB)
 SILENCE_DURATION = 1.0 # seconds of silence to split on
 WHISPER_MODEL = "large"  # or "medium", "small"
 LANGUAGE = "en"
+DECODE_OPTIONS = {"condition_on_previous_text": False}
 # ----------------------------------------
 
 def detect_silences(mp3_path):
@@ -41,6 +46,17 @@ def detect_silences(mp3_path):
 
 
 def split_audio(mp3_path, silence_points, tmp_dir):
+    with instrument.timer("split_audio", silences=len(silence_points)):
+        chunks = _split_audio(mp3_path, silence_points, tmp_dir)
+    instrument.count("chunks", len(chunks))
+    return chunks
+
+
+def _split_audio(mp3_path, silence_points, tmp_dir):
+    """
+    Returns [(chunk_path, start_seconds)]; the offsets put each chunk's
+    segment timestamps back on the recording's timeline.
+    """
     chunks = []
     prev = 0.0
 
@@ -60,12 +76,12 @@ def split_audio(mp3_path, silence_points, tmp_dir):
         ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
         if out.exists() and out.stat().st_size > 1024:
-            chunks.append(out)
+            chunks.append((out, prev))
 
         prev = t
 
     # final tail
-    out = tmp_dir / f"chunk_{len(chunks):04d}.mp3"
+    out = tmp_dir / f"chunk_{len(silence_points):04d}.mp3"
     subprocess.run([
         "ffmpeg",
         "-y",
@@ -79,37 +95,68 @@ def split_audio(mp3_path, silence_points, tmp_dir):
     ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
 
     if out.exists() and out.stat().st_size > 1024:
-        chunks.append(out)
+        chunks.append((out, prev))
 
     return chunks
 
 
 
-def transcribe_chunks(chunks):
-    model = whisper.load_model(WHISPER_MODEL)
+def transcribe_chunks(chunks, cache=None):
+    """
+    Transcribes each (chunk, offset) pair, consulting the transcript cache (if
+    given) before running Whisper. The model is only loaded on the first miss.
+    Returns (text, segments) where segments are Whisper's segments shifted to
+    the recording's timeline: [{"start", "end", "text"}] in seconds.
+    """
+    model = None
     transcript = []
-
-    for chunk in chunks:
-        print(f"→ Transcribing {chunk.name}")
-        result = model.transcribe(
-            str(chunk),
-            language=LANGUAGE,
-            condition_on_previous_text=False
-        )
+    segments = []
+
+    for chunk, offset in chunks:
+        # Decode once: the samples are both the cache key and Whisper's input
+        with instrument.timer("load_audio", chunk=chunk.name):
+            audio = whisper.load_audio(str(chunk))
+        key = audio_key(audio, WHISPER_MODEL, LANGUAGE, DECODE_OPTIONS)
+        result = cache.get(key) if cache else None
+
+        if result is None:
+            print(f"→ Transcribing {chunk.name}")
+            if model is None:
+                with instrument.timer("load_model", model=WHISPER_MODEL):
+                    model = whisper.load_model(WHISPER_MODEL)
+            start = time.perf_counter()
+            with instrument.timer("transcribe", chunk=chunk.name, seconds=len(audio) / whisper.audio.SAMPLE_RATE):
+                result = model.transcribe(
+                    audio,
+                    language=LANGUAGE,
+                    **DECODE_OPTIONS
+                )
+            instrument.count("whisper_calls")
+            if cache:
+                cache.put(key, result, time.perf_counter() - start)
+        else:
+            print(f"→ Cached {chunk.name}")
+            instrument.count("cache_hits")
 
         text = result["text"].strip()
         if text:
             transcript.append(text)
+        for seg in result.get("segments", []):
+            if seg["text"].strip():
+                segments.append({"start": round(offset + seg["start"], 2), "end": round(offset + seg["end"], 2),
+                                 "text": seg["text"].strip()})
 
-    return "\n\n".join(transcript)
+    return "\n\n".join(transcript), segments
 
 
-def main(mp3_path):
+def main(mp3_path, use_cache=True):
     mp3_path = pathlib.Path(mp3_path).resolve()
     output_txt = mp3_path.with_suffix(".txt")
+    output_segments = mp3_path.with_suffix(".segments.json")
 
     print("Detecting silence…")
-    silences = detect_silences(mp3_path)
+    with instrument.timer("detect_silences"):
+        silences = detect_silences(mp3_path)
 
     with tempfile.TemporaryDirectory() as tmp:
         tmp_dir = pathlib.Path(tmp)
@@ -120,15 +167,26 @@ def main(mp3_path):
         print(f"{len(chunks)} chunks created")
         print("Running Whisper…")
 
-        full_text = transcribe_chunks(chunks)
+        cache = TranscriptCache() if use_cache else None
+        try:
+            full_text, segments = transcribe_chunks(chunks, cache)
+        finally:
+            if cache:
+                print(cache.stats())
+                cache.close()
 
     output_txt.write_text(full_text, encoding="utf-8")
-    print(f"✓ Transcription written to {output_txt}")
+    output_segments.write_text(json.dumps(segments, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"✓ Transcription written to {output_txt} ({len(segments)} timed segments in {output_segments.name})")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python transcribe_split_whisper.py input.mp3")
-        sys.exit(1)
-
-    main(sys.argv[1])
+    parser = argparse.ArgumentParser(description="Split an mp3 on silence and transcribe it with Whisper")
+    parser.add_argument("input", help="input.mp3")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the transcript cache")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    instrument.configure(args.metrics)
+
+    with instrument.profile(args.profile):
+        main(args.input, use_cache=not args.no_cache)
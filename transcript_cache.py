@@ -0,0 +1,101 @@
+"""
+transcript_cache.py
+Single-file SQLite cache of Whisper transcripts.
+
+Entries are keyed by the SHA-256 of a chunk's decoded PCM samples together with
+the Whisper model, language and decode options, so re-splitting a recording only
+pays for chunks whose audio actually changed. The least recently used entries
+are evicted once the stored results exceed a size limit.
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from typing import Dict, Optional
+
+CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "hymnal", "transcripts.sqlite")
+MAX_CACHE_BYTES = 256 * 1024 * 1024  # evict least recently used beyond this
+
+
+def audio_key(samples, model_name: str, language: str, options: Dict) -> str:
+    """Hash of the PCM samples plus everything that changes Whisper's output."""
+    h = hashlib.sha256()
+    h.update(memoryview(samples).cast("B"))
+    h.update(json.dumps({"model": model_name, "language": language, "options": options},
+                        sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = MAX_CACHE_BYTES):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0  # transcription time not spent thanks to hits
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " key TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " elapsed REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS transcripts_lru ON transcripts(last_used)")
+        self.db.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self.db.execute("SELECT result, elapsed FROM transcripts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += row[1]
+        self.db.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (time.time(), key))
+        self.db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict, elapsed: float):
+        """Store a transcribe() result. `elapsed` is how long Whisper took for it."""
+        blob = json.dumps(result, ensure_ascii=False, default=float)
+        self.db.execute(
+            "INSERT OR REPLACE INTO transcripts (key, result, size, elapsed, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, blob, len(blob), elapsed, time.time()),
+        )
+        self.db.commit()
+        self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        total = self.size()
+        if total <= self.max_bytes:
+            return 0
+        removed = 0
+        rows = self.db.execute("SELECT key, size FROM transcripts ORDER BY last_used").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+            total -= size
+            removed += 1
+        self.db.commit()
+        return removed
+
+    def size(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+
+    def stats(self) -> str:
+        entries = self.db.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+        lookups = self.hits + self.misses
+        rate = 100.0 * self.hits / lookups if lookups else 0.0
+        return (f"cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"~{self.saved_seconds:.0f}s of Whisper saved, {entries} entries, "
+                f"{self.size() / 1e6:.1f}/{self.max_bytes / 1e6:.0f} MB")
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+verse_alignment.py
+Timestamped verse-level alignment of a service transcript to hymn lyrics.
+
+transcribe_split_whisper.py writes Whisper's timed segments next to the
+transcript (<recording>.segments.json). Each segment's words get times
+interpolated across the segment, and the lyrics of each hymn are cut into
+units: every numbered verse, anchored by its opening words, and the refrain.
+Each unit is found in the word stream with an approximate-substring edit
+distance DP over word ids. A substitution costs less when the OCR'd lyric
+word only looks like the sung one ("namel"/"name"), and merged words
+("whoreigns") are split. A unit of m lyric words can match anywhere with up
+to MAX_ERROR_RATE * m edits.
+
+The DP fills one row per lyric word with numpy over the whole band of
+transcript positions. The insertion recurrence along a row is a running
+minimum (np.minimum.accumulate), so no Python loop runs over transcript
+words. The band is limited to the stretches around exact lyric bigrams
+("seeds"), so a three-hour service only pays for the minutes the hymn was
+sung. A verse runs from its match until the next matched unit starts.
+
+Usage examples:
+  Given hymns:  python verse_alignment.py service.segments.json --hymns 12 45 312
+  Auto-detect:  python verse_alignment.py service.segments.json --out service.verses.json
+"""
+
+from __future__ import annotations
+import re
+import sys
+import json
+import time
+import argparse
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from live_hymn_id import CONFIDENCE_THRESHOLD, HymnScorer, hymns_from_songs, normalize_words
+
+# ---- Config ----
+SONGS_JSON = "hymnal_songs.json"
+MAX_ERROR_RATE = 0.4  # word edits per lyric word for a unit to count as sung
+SIMILAR_COST = 0.5  # substituting a look-alike word ("namel" for "name")
+ANCHOR_WORDS = 16  # lyric words used to find a verse; the verse runs until the next unit
+MIN_UNIT_WORDS = 4  # shorter units match too easily to be trusted
+SEED_PAD = 2.0  # band around seeds, in multiples of the longest unit
+SHORTLIST_WINDOW = 60  # transcript words per window when detecting hymns
+MIN_WINDOWS = 2  # windows a hymn must win to be aligned when no hymns are given
+MIN_WINDOW_SCORE = 20.0  # IDF bigram score for a window to count as sung (not speech)
+
+VERSE_MARK_RE = re.compile(r"^\s*(\d{1,2})\s*[.,]")
+REFRAIN_RE = re.compile(r"^\s*(re\w{0,2}ai\w?|chorus)\W*$", re.IGNORECASE)  # OCR: REFRaIN, Refkaik, REFBAIN
+
+
+# ---- Transcript words ----
+def word_timings(segments: List[Dict]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Words of all segments with start/end times spread over each segment by character length."""
+    words, starts, ends = [], [], []
+    for seg in segments:
+        ws = normalize_words(seg["text"])
+        if not ws:
+            continue
+        lengths = np.array([len(w) + 1 for w in ws], np.float64)
+        edges = seg["start"] + (seg["end"] - seg["start"]) * np.concatenate([[0], np.cumsum(lengths)]) / lengths.sum()
+        words.extend(ws)
+        starts.append(edges[:-1])
+        ends.append(edges[1:])
+    if not words:
+        return [], np.zeros(0), np.zeros(0)
+    return words, np.concatenate(starts), np.concatenate(ends)
+
+
+# ---- Hymn units ----
+def split_units(lyrics: str) -> List[Dict]:
+    """
+    [{"label": "verse 1" | "refrain", "words": [...]}] from hymnal_songs.json lyrics.
+    OCR interleaves the verses' later lines, so a verse is represented by its
+    opening words only; the refrain block is usually contiguous.
+    """
+    units: List[Dict] = []
+    current: Optional[Dict] = None
+    for line in (lyrics or "").split("\n"):
+        m = VERSE_MARK_RE.match(line)
+        if m:
+            current = {"label": f"verse {int(m.group(1))}", "words": []}
+            units.append(current)
+            line = line[m.end():]
+        elif REFRAIN_RE.match(line):
+            current = {"label": "refrain", "words": []}
+            units.append(current)
+            continue
+        if current is not None:
+            current["words"].extend(normalize_words(line))
+    seen = set()
+    out = []
+    for u in units:
+        if u["label"] in seen or len(u["words"]) < MIN_UNIT_WORDS:
+            continue
+        seen.add(u["label"])
+        out.append({"label": u["label"], "words": u["words"][:ANCHOR_WORDS]})
+    return out
+
+
+def split_merged(word: str, vocab: Dict[str, int]) -> List[str]:
+    """"whoreigns" -> ["who", "reigns"] when both halves were actually sung."""
+    if word in vocab:
+        return [word]
+    for i in range(2, len(word) - 1):
+        if word[:i] in vocab and word[i:] in vocab:
+            return [word[:i], word[i:]]
+    return [word]
+
+
+def substitution_costs(unit_words: List[str], vocab: Dict[str, int]) -> np.ndarray:
+    """(m, V) cost of singing vocab word v where lyric word i is written."""
+    costs = np.ones((len(unit_words), len(vocab) + 1), np.float32)  # last column: unknown word
+    by_prefix: Dict[str, List[int]] = {}
+    for w, i in vocab.items():
+        if len(w) >= 4:
+            by_prefix.setdefault(w[:4], []).append(i)
+    for i, w in enumerate(unit_words):
+        if len(w) >= 4:
+            costs[i, by_prefix.get(w[:4], [])] = SIMILAR_COST
+        if w[:-1] in vocab:  # trailing OCR junk: "namel", "sou!"
+            costs[i, vocab[w[:-1]]] = SIMILAR_COST
+        if w in vocab:
+            costs[i, vocab[w]] = 0.0
+    return costs
+
+
+# ---- Edit-distance DP ----
+def _last_row(costs: np.ndarray, text: np.ndarray, anchored: bool) -> np.ndarray:
+    """
+    Final DP row for the pattern rows of `costs` against word ids `text`.
+    Semi-global (the match may start anywhere) unless `anchored`, where it
+    must start at text[0]. D[i][j] = min(D[i-1][j-1] + sub, D[i-1][j] + 1,
+    D[i][j-1] + 1); the last term is a running minimum over (D - j) + j.
+    """
+    n = len(text)
+    j = np.arange(n + 1, dtype=np.float32)
+    row = j.copy() if anchored else np.zeros(n + 1, np.float32)
+    for i in range(len(costs)):
+        best = np.empty(n + 1, np.float32)
+        best[0] = i + 1
+        np.minimum(row[:-1] + costs[i, text], row[1:] + 1, out=best[1:])
+        row = np.minimum.accumulate(best - j) + j
+    return row
+
+
+def find_unit(costs: np.ndarray, text: np.ndarray, max_cost: float) -> List[Tuple[int, int, float]]:
+    """Non-overlapping matches of one unit as (start, end, cost), end exclusive, best first."""
+    m = len(costs)
+    last = _last_row(costs, text, anchored=False)
+    candidates = np.flatnonzero(last <= max_cost)
+    if len(candidates) == 0:
+        return []
+    taken = np.zeros(len(last), bool)
+    hits = []
+    for end in candidates[np.lexsort((candidates, last[candidates]))]:
+        if taken[end]:
+            continue
+        # Start: anchored DP of the reversed unit over the reversed band ending at `end`.
+        lo = max(0, end - int(m + max_cost) - 1)
+        back = _last_row(costs[::-1], text[lo:end][::-1], anchored=True)
+        start = end - int(np.argmin(back))
+        hits.append((int(start), int(end), float(last[end])))
+        taken[max(0, end - m // 2):end + m // 2 + 1] = True
+    return hits
+
+
+def seed_bands(text: np.ndarray, hymn_ids: List[np.ndarray], pad: int) -> List[Tuple[int, int]]:
+    """Transcript ranges within `pad` words of a bigram that also occurs in the hymn."""
+    if len(text) < 2:
+        return []
+    key = text[:-1].astype(np.int64) * (1 << 32) + text[1:]
+    hymn_keys = np.unique(np.concatenate([ids[:-1].astype(np.int64) * (1 << 32) + ids[1:] for ids in hymn_ids]))
+    seeds = np.flatnonzero(np.isin(key, hymn_keys))
+    bands = []
+    for p in seeds:
+        lo, hi = max(0, int(p) - pad), min(len(text), int(p) + pad)
+        if bands and lo <= bands[-1][1]:
+            bands[-1] = (bands[-1][0], hi)
+        else:
+            bands.append((lo, hi))
+    return bands
+
+
+def align_hymn(words: List[str], starts: np.ndarray, ends: np.ndarray, vocab: Dict[str, int],
+               text: np.ndarray, song: Dict, max_error_rate: float = MAX_ERROR_RATE) -> List[Dict]:
+    """Sung occurrences of one hymn's units, in time order, with start/end seconds."""
+    units = split_units(song.get("song_lyrics"))
+    if not units or len(text) == 0:
+        return []
+    unknown = len(vocab)
+    for u in units:
+        u["words"] = [w for part in u["words"] for w in split_merged(part, vocab)]
+        u["ids"] = np.array([vocab.get(w, unknown) for w in u["words"]], np.int32)
+        u["costs"] = substitution_costs(u["words"], vocab)
+    pad = int(SEED_PAD * max(len(u["words"]) for u in units))
+
+    matches = []
+    for lo, hi in seed_bands(text, [u["ids"] for u in units], pad):
+        for u in units:
+            for s, e, cost in find_unit(u["costs"], text[lo:hi], max_error_rate * len(u["words"])):
+                matches.append({"label": u["label"], "start_word": lo + s, "end_word": lo + e,
+                                "error_rate": round(cost / len(u["words"]), 3)})
+
+    # Units share phrases; keep the best match wherever two overlap by more than half.
+    kept: List[Dict] = []
+    for mt in sorted(matches, key=lambda mt: mt["error_rate"]):
+        span = mt["end_word"] - mt["start_word"]
+        if all(min(mt["end_word"], k["end_word"]) - max(mt["start_word"], k["start_word"]) <= span / 2 for k in kept):
+            kept.append(mt)
+    kept.sort(key=lambda mt: mt["start_word"])
+
+    for i, mt in enumerate(kept):
+        mt["start"] = round(float(starts[mt["start_word"]]), 2)
+        nxt = kept[i + 1]["start_word"] if i + 1 < len(kept) else None
+        if nxt is not None and nxt - mt["end_word"] < 4 * ANCHOR_WORDS:
+            mt["end"] = round(float(starts[nxt]), 2)  # the verse lasts until the next unit begins
+        else:
+            mt["end"] = round(float(ends[mt["end_word"] - 1]), 2)
+    return kept
+
+
+def shortlist(words: List[str], scorer: HymnScorer, min_windows: int = MIN_WINDOWS) -> List[int]:
+    """
+    Hymns (indexes into scorer.hymns) that clearly win at least `min_windows`
+    transcript windows, by the same leader/runner-up rule as live_hymn_id.
+    """
+    wins: Counter = Counter()
+    step = SHORTLIST_WINDOW // 2
+    for i in range(0, max(len(words) - step, 1), step):
+        scores = scorer.score(" ".join(words[i:i + SHORTLIST_WINDOW]))
+        if not scores:
+            continue
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:2]
+        best, top = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if top >= MIN_WINDOW_SCORE and 1.0 - runner_up / top >= CONFIDENCE_THRESHOLD:
+            wins[best] += 1
+    return [hid for hid, n in wins.most_common() if n >= min_windows]
+
+
+def align_recording(segments: List[Dict], songs: List[Dict], numbers: Optional[List[int]] = None) -> List[Dict]:
+    """
+    Per-hymn verse timings for one recording:
+      [{"number", "title", "start", "end", "units": [{"label", "start", "end", "error_rate", ...}]}]
+    """
+    words, starts, ends = word_timings(segments)
+    vocab: Dict[str, int] = {}
+    text = np.array([vocab.setdefault(w, len(vocab)) for w in words], np.int32)
+
+    if numbers:
+        by_number = {s.get("song_number"): s for s in songs}
+        chosen = [by_number[n] for n in numbers if n in by_number]
+    else:
+        scorer = HymnScorer(hymns_from_songs(songs))
+        chosen = [songs[scorer.hymns[hid]["index"]] for hid in shortlist(words, scorer)]
+
+    results = []
+    for song in chosen:
+        units = align_hymn(words, starts, ends, vocab, text, song)
+        if units:
+            results.append({"number": song.get("song_number"), "title": song.get("song_title"),
+                            "start": units[0]["start"], "end": units[-1]["end"], "units": units})
+    results.sort(key=lambda r: r["start"])
+    return results
+
+
+# ---- CLI ----
+def _clock(seconds: float) -> str:
+    h, rem = divmod(int(seconds), 3600)
+    return f"{h}:{rem // 60:02d}:{rem % 60:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Align a timed transcript to hymn verses")
+    parser.add_argument("segments", help="<recording>.segments.json from transcribe_split_whisper.py")
+    parser.add_argument("--songs", default=SONGS_JSON)
+    parser.add_argument("--hymns", type=int, nargs="+", help="Song numbers sung (default: detect from the transcript)")
+    parser.add_argument("--out", help="Write the alignment as JSON")
+    args = parser.parse_args()
+
+    with open(args.segments, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    with open(args.songs, "r", encoding="utf-8") as f:
+        songs = json.load(f)
+
+    start = time.perf_counter()
+    results = align_recording(segments, songs, args.hymns)
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        print(f"#{r['number']} {r['title']}  {_clock(r['start'])}-{_clock(r['end'])}")
+        for u in r["units"]:
+            print(f"    {u['label']:<9} {_clock(u['start'])}-{_clock(u['end'])}  (error {u['error_rate']:.2f})")
+    duration = segments[-1]["end"] if segments else 0.0
+    print(f"Aligned {len(results)} hymn(s) over {_clock(duration)} of audio in {elapsed:.2f}s", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == "__main__":
+    main()